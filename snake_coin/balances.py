@@ -0,0 +1,116 @@
+import json
+import os
+from collections import defaultdict
+
+from mempool import BLOCK_REWARD, COINBASE, transaction_cost, transaction_fee
+
+SNAPSHOT_EVERY = 1000
+
+
+class BalanceIndex:
+    # account balances of a BlockStore, kept up to date as blocks are
+    # connected and disconnected; a snapshot next to the chain file means
+    # a restart only replays the blocks stored after it
+
+    def __init__(self, chain, path=None, snapshot_every=SNAPSHOT_EVERY):
+        self.chain = chain
+        self.path = path or chain.path + '.balances'
+        self.snapshot_every = snapshot_every
+        self.balances = {}
+        self.height = 0
+        self._load()
+        chain.add_listener(self)
+        chain.add_validator(self.check_branch)
+
+    def balance(self, address):
+        return self.balances.get(address, 0)
+
+    def can_spend(self, address, amount):
+        return address != COINBASE and amount <= self.balance(address)
+
+    def _credit(self, address, amount):
+        balance = self.balances.get(address, 0) + amount
+        if balance:
+            self.balances[address] = balance
+        else:
+            self.balances.pop(address, None)
+
+    def _apply(self, block, sign):
+        for address, amount in _transfers(block):
+            self._credit(address, sign * amount)
+
+    def check_branch(self, start, blocks):
+        # raises ValueError if one of blocks, replacing the chain from height
+        # start up, pays its miner more than it may or spends more than its
+        # sender has at that point
+        changes = defaultdict(int)
+        for height in range(start, len(self.chain)):
+            for address, amount in _transfers(self.chain[height]):
+                changes[address] -= amount
+        for block in blocks:
+            check_coinbase(block)
+            for address, amount in _transfers(block):
+                changes[address] += amount
+                if amount < 0 and self.balance(address) + changes[address] < 0:
+                    raise ValueError('block {} overdraws {}'.format(block.index, address))
+
+    def connect(self, block, height):
+        self._apply(block, 1)
+        self.height = height + 1
+        if self.height % self.snapshot_every == 0:
+            self.snapshot()
+
+    def disconnect(self, block, height):
+        self._apply(block, -1)
+        self.height = height
+
+    def snapshot(self):
+        # the chain is synced first so the snapshot never refers to blocks
+        # that could be lost, and the file is replaced atomically
+        self.chain.sync()
+        state = {
+            'height': self.height,
+            'tip': self.chain.hash_at(self.height - 1) if self.height else None,
+            'balances': self.balances
+        }
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as snapshot_file:
+            json.dump(state, snapshot_file, separators=(',', ':'))
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temporary, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path) as snapshot_file:
+                state = json.load(snapshot_file)
+        except (OSError, ValueError):
+            state = None
+        # a snapshot is only used if its tip is still on our chain
+        if state and 0 < state['height'] <= len(self.chain) \
+                and self.chain.hash_at(state['height'] - 1) == state['tip']:
+            self.balances = state['balances']
+            self.height = state['height']
+        for height in range(self.height, len(self.chain)):
+            self._apply(self.chain[height], 1)
+        self.height = len(self.chain)
+
+
+def _transfers(block):
+    # (address, change of its balance) for every transaction, in order
+    for transaction in block.transactions:
+        if transaction['from'] != COINBASE:
+            yield transaction['from'], -transaction_cost(transaction)
+        yield transaction['to'], transaction['amount']
+
+
+def check_coinbase(block):
+    # at most one reward per block, of at most BLOCK_REWARD plus the fees
+    # of the block's other transactions
+    rewards = [transaction for transaction in block.transactions if transaction['from'] == COINBASE]
+    if len(rewards) > 1:
+        raise ValueError('block {} has more than one coinbase'.format(block.index))
+    fees = sum(transaction_fee(transaction) for transaction in block.transactions
+               if transaction['from'] != COINBASE)
+    if rewards and rewards[0]['amount'] > BLOCK_REWARD + fees:
+        raise ValueError('block {} pays its miner too much'.format(block.index))
@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import datetime as date
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import mining
+from block_store import BlockStore
+from snake_coin import Block, decode_block, encode_block
+
+# every metric is a rate (higher is better) unless its name ends in _ms
+CHAIN_LENGTHS = (100, 1000)
+TRANSACTION_COUNTS = (0, 10, 100, 1000)
+# a metric this much worse than the baseline counts as a regression
+TOLERANCE = 0.10
+
+
+def make_transactions(count, seed=0):
+    return [{'from': 'sender-{}'.format((seed + i) % 97), 'to': 'receiver-{}'.format(i % 89),
+             'amount': 1000 + i, 'fee': i % 7, 'nonce': seed + i} for i in range(count)]
+
+
+def make_block(index, previous_hash, transactions):
+    data = {'transactions': make_transactions(transactions, index)} if transactions else 'Block' + str(index)
+    return Block(index, date.datetime(2018, 1, 1) + date.timedelta(seconds=index), data, previous_hash)
+
+
+def repeat_for(function, seconds):
+    # calls function until `seconds` have passed, returns (calls, elapsed)
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return calls, elapsed
+
+
+def bench_hashing(seconds):
+    block = make_block(1, '0', 10)
+    calls, elapsed = repeat_for(block.hash_block, seconds)
+    # the nonce search hashes only the nonce on top of a cached midstate;
+    # 256 bits can't be met, so it runs exactly `limit` hashes
+    started = time.perf_counter()
+    _, _, hashes = mining.search_nonces(block.header_prefix(), 256, 0, 1, limit=mining.BATCH_SIZE * 10)
+    return {
+        'hash_block_per_second': calls / elapsed,
+        'search_nonces_per_second': hashes / (time.perf_counter() - started)
+    }
+
+
+def bench_mining(bits, workers, blocks):
+    hashes = 0
+    started = time.perf_counter()
+    previous_hash = '0'
+    for index in range(blocks):
+        block = make_block(index, previous_hash, 10)
+        hashes += mining.mine_block(block, bits, workers).hashes
+        previous_hash = block.hash
+    elapsed = time.perf_counter() - started
+    return {
+        'mined_blocks_per_second[bits={}]'.format(bits): blocks / elapsed,
+        'mining_hashes_per_second[bits={}]'.format(bits): hashes / elapsed
+    }
+
+
+def build_chain(path, length, transactions):
+    chain = BlockStore(path)
+    previous_hash = '0'
+    for index in range(length):
+        block = make_block(index, previous_hash, transactions)
+        chain.append(block)
+        previous_hash = block.hash
+    chain.sync()
+    return chain
+
+
+def bench_chain_building(directory, length, transactions):
+    path = os.path.join(directory, 'build-{}-{}.dat'.format(length, transactions))
+    started = time.perf_counter()
+    build_chain(path, length, transactions).close()
+    elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    chain = BlockStore(path)
+    for _ in chain:
+        pass
+    read = time.perf_counter() - started
+    chain.close()
+    key = '[length={},transactions={}]'.format(length, transactions)
+    return {
+        'chain_build_blocks_per_second' + key: length / elapsed,
+        'chain_read_blocks_per_second' + key: length / read
+    }
+
+
+def bench_serialization(transactions, seconds):
+    block = make_block(1, '0', transactions)
+    payload = encode_block(block)
+    calls, elapsed = repeat_for(lambda: encode_block(block), seconds)
+    encoded = calls * len(payload) / elapsed
+    calls, elapsed = repeat_for(lambda: decode_block(payload), seconds)
+    decoded = calls * len(payload) / elapsed
+    key = '[transactions={}]'.format(transactions)
+    return {
+        'encode_mb_per_second' + key: encoded / 1e6,
+        'decode_mb_per_second' + key: decoded / 1e6,
+        'block_bytes' + key: len(payload)
+    }
+
+
+def import_node(directory):
+    # snake_server opens its chain (genesis.CHAIN_PATH) at import, keep that
+    # file in the scratch directory rather than the working one
+    if 'snake_server' not in sys.modules:
+        previous = os.environ.get('SNAKE_COIN_CHAIN')
+        os.environ['SNAKE_COIN_CHAIN'] = os.path.join(directory, 'node.dat')
+        try:
+            import snake_server
+        finally:
+            if previous is None:
+                del os.environ['SNAKE_COIN_CHAIN']
+            else:
+                os.environ['SNAKE_COIN_CHAIN'] = previous
+    return sys.modules['snake_server']
+
+
+async def fetch_blocks_ms(directory, length, transactions, requests):
+    import aiohttp
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+
+    node = import_node(directory)
+    app = web.Application()
+    app.add_routes(node.routes)
+    # the handlers read the module's block_chain, which is swapped for the
+    # benchmark chain only while the requests run
+    chain = build_chain(os.path.join(directory, 'serve-{}-{}.dat'.format(length, transactions)),
+                        length, transactions)
+    node_chain = node.block_chain
+    node.block_chain = chain
+    timings = []
+    try:
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            for _ in range(requests):
+                started = time.perf_counter()
+                async with session.get(server.make_url('/blocks')) as response:
+                    await response.read()
+                timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        node.block_chain = node_chain
+        chain.close()
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def bench_blocks_endpoint(directory, length, transactions, requests):
+    median = asyncio.run(fetch_blocks_ms(directory, length, transactions, requests))
+    return {'blocks_response_ms[length={},transactions={}]'.format(length, transactions): median}
+
+
+def run(seconds, bits, workers, mined_blocks, lengths, transaction_counts, requests):
+    directory = tempfile.mkdtemp(prefix='snake_coin_bench')
+    results = {}
+    try:
+        results.update(bench_hashing(seconds))
+        results.update(bench_mining(bits, workers, mined_blocks))
+        for transactions in transaction_counts:
+            results.update(bench_serialization(transactions, seconds))
+        for length in lengths:
+            for transactions in transaction_counts:
+                results.update(bench_chain_building(directory, length, transactions))
+                results.update(bench_blocks_endpoint(directory, length, transactions, requests))
+    finally:
+        # the node's own chain is in the scratch directory too
+        if 'snake_server' in sys.modules:
+            sys.modules['snake_server'].block_chain.close()
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        'meta': {
+            'time': date.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'bits': bits,
+            'workers': workers
+        },
+        'results': results
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    # returns (metric, baseline value, new value) for every regression
+    regressions = []
+    for metric, old in baseline['results'].items():
+        new = results['results'].get(metric)
+        if new is None or not old or metric.startswith('block_bytes'):
+            continue
+        if metric.split('[')[0].endswith('_ms'):
+            worse = new > old * (1 + tolerance)
+        else:
+            worse = new < old * (1 - tolerance)
+        if worse:
+            regressions.append((metric, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark snake_coin hashing, mining, storage and serving.')
+    parser.add_argument('--seconds', type=float, default=1.0, help='time spent on each rate measurement')
+    parser.add_argument('--bits', type=int, default=16, help='difficulty of the mining benchmark')
+    parser.add_argument('--workers', type=int, default=None, help='mining processes (default: one per core)')
+    parser.add_argument('--mined-blocks', type=int, default=4)
+    parser.add_argument('--lengths', type=int, nargs='+', default=list(CHAIN_LENGTHS))
+    parser.add_argument('--transactions', type=int, nargs='+', default=list(TRANSACTION_COUNTS))
+    parser.add_argument('--requests', type=int, default=5, help='/blocks requests per chain, the median is kept')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to check the results against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run(args.seconds, args.bits, args.workers, args.mined_blocks, args.lengths,
+                  args.transactions, args.requests)
+    for metric, value in results['results'].items():
+        print('{:<64} {:>14.2f}'.format(metric, value))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for metric, old, new in regressions:
+            print('REGRESSION {}: {:.2f} -> {:.2f}'.format(metric, old, new))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+import array
+import mmap
+import os
+import struct
+import zlib
+from collections import deque, namedtuple
+
+from snake_coin import block_work, decode_block, encode_block, hash_to_bytes
+
+# every record in the segment file is <payload length><crc32><payload>
+RECORD_HEADER = struct.Struct('>II')
+# the index file maps height -> (record offset, block hash, cumulative work
+# of the chain up to and including the block)
+INDEX_ENTRY = struct.Struct('>Q32s32s')
+HASH_OFFSET = struct.calcsize('>Q')
+# truncate() leaves this record in the segment file in place of cutting it:
+# blocks written before it from the given height up are gone. A block's
+# payload starts with its version, never with the marker
+TRUNCATE_MARK = struct.Struct('>4sQ')
+MARKER = b'\xffcut'
+SYNC_EVERY = 16
+# height_of() finds the hashes of the newest RECENT_HASHES blocks in memory
+# (about 150 bytes each) and older ones by scanning the index file backwards,
+# HASH_SCAN_ENTRIES entries per read: tens of ms per million blocks, paid only
+# for hashes deep in the chain, such as the sparse end of a peer's locator
+RECENT_HASHES = 4096
+HASH_SCAN_ENTRIES = 4096
+
+# what a reader sees of the chain, published anew (one attribute store) on
+# every append or reorg. Heights below `length` never change for whoever
+# holds a head: appends only grow `offsets` past them, a reorg replaces it
+# with a copy, and records are never overwritten while the store is open
+ChainHead = namedtuple('ChainHead', ['version', 'length', 'offsets', 'tip', 'tip_work'])
+
+
+class BlockStore:
+    # append-only block file plus a fixed-size index, usable in place of the
+    # old block_chain list: len(), [height], iteration and append(); only the
+    # offsets and the newest hashes stay in memory, blocks are read on demand.
+    # Readers work from self.head and never wait for a writer
+
+    def __init__(self, path, sync_every=SYNC_EVERY, recent_hashes=RECENT_HASHES):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.sync_every = sync_every
+        self._data = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._index = os.open(self.index_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._offsets = array.array('Q')
+        # hash -> height for the heights len(self) - len(self._recent) up
+        self._heights = {}
+        self._recent = deque(maxlen=recent_hashes)
+        self._end = 0
+        self._work = 0
+        self._unsynced = 0
+        self._map = None
+        self.head = ChainHead(0, 0, self._offsets, None, 0)
+        self._listeners = []
+        self._validators = []
+        self._recover()
+
+    def _read_record(self, offset, limit):
+        # returns the payload stored at offset, or None if the record is torn
+        if offset + RECORD_HEADER.size > limit:
+            return None
+        length, crc = RECORD_HEADER.unpack(os.pread(self._data, RECORD_HEADER.size, offset))
+        if offset + RECORD_HEADER.size + length > limit:
+            return None
+        payload = os.pread(self._data, length, offset + RECORD_HEADER.size)
+        if zlib.crc32(payload) != crc:
+            return None
+        return payload
+
+    def _recover(self):
+        data_size = os.fstat(self._data).st_size
+        raw_index = os.pread(self._index, os.fstat(self._index).st_size, 0)
+        entries = [INDEX_ENTRY.unpack_from(raw_index, i * INDEX_ENTRY.size)
+                   for i in range(len(raw_index) // INDEX_ENTRY.size)]
+        # index entries may have hit the disk before the blocks they point to:
+        # drop them from the end until one points at an intact record
+        while entries and self._read_record(entries[-1][0], data_size) is None:
+            entries.pop()
+        for offset, block_hash, _ in entries:
+            self._remember(block_hash)
+            self._offsets.append(offset)
+        tip = None
+        if entries:
+            last, tip, work = entries[-1]
+            self._end = last + RECORD_HEADER.size + len(self._read_record(last, data_size))
+            self._work = int.from_bytes(work, 'big')
+        if len(raw_index) != len(entries) * INDEX_ENTRY.size:
+            os.ftruncate(self._index, len(entries) * INDEX_ENTRY.size)
+        # records written after the last index entry made it to disk: blocks
+        # are indexed again and truncate marks replayed, so a reorg whose
+        # index changes were lost still drops the old branch. Blocks that do
+        # not extend the tip belong to a branch dropped before marks existed
+        while True:
+            payload = self._read_record(self._end, data_size)
+            if payload is None:
+                break
+            if payload[:len(MARKER)] == MARKER:
+                tip = self._cut_index(min(TRUNCATE_MARK.unpack(payload)[1], len(self._offsets)))
+            else:
+                block = decode_block(payload)
+                if tip is None or hash_to_bytes(block.previous_hash) == tip:
+                    self._add_index(self._end, block)
+                    tip = hash_to_bytes(block.hash)
+            self._end += RECORD_HEADER.size + len(payload)
+        # whatever follows is a torn write
+        if self._end < data_size:
+            os.ftruncate(self._data, self._end)
+        self.sync()
+        self._publish(decode_block(self._read_record(self._offsets[-1], self._end)) if self._offsets else None)
+
+    def _write_record(self, payload):
+        offset = self._end
+        os.write(self._data, RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._end += RECORD_HEADER.size + len(payload)
+        return offset
+
+    def _cut_index(self, height):
+        # forgets the index from height up, returns the new tip's hash.
+        # Readers holding an older head keep its offsets: the array is
+        # replaced with a copy, never shortened in place
+        for _ in range(min(len(self._recent), len(self._offsets) - height)):
+            del self._heights[self._recent.pop()]
+        tip = None
+        self._work = 0
+        if height:
+            _, tip, work = INDEX_ENTRY.unpack(os.pread(self._index, INDEX_ENTRY.size, (height - 1) * INDEX_ENTRY.size))
+            self._work = int.from_bytes(work, 'big')
+        self._offsets = self._offsets[:height]
+        os.ftruncate(self._index, height * INDEX_ENTRY.size)
+        return tip
+
+    def _add_index(self, offset, block):
+        raw_hash = hash_to_bytes(block.hash)
+        self._work += block_work(block.bits)
+        os.write(self._index, INDEX_ENTRY.pack(offset, raw_hash, self._work.to_bytes(32, 'big')))
+        self._remember(raw_hash)
+        self._offsets.append(offset)
+
+    def _remember(self, raw_hash):
+        # maps the hash of the block about to be indexed, forgetting the
+        # oldest one once the window is full
+        if len(self._recent) == self._recent.maxlen:
+            del self._heights[self._recent[0]]
+        self._recent.append(raw_hash)
+        self._heights[raw_hash] = len(self._offsets)
+
+    def _publish(self, tip):
+        self.head = ChainHead(self.head.version + 1, len(self._offsets), self._offsets, tip, self._work)
+
+    @property
+    def tip_work(self):
+        return self.head.tip_work
+
+    def add_listener(self, listener):
+        # listener.connect(block, height) runs after a block is appended and
+        # listener.disconnect(block, height) before truncate() drops it
+        self._listeners.append(listener)
+
+    def add_validator(self, check):
+        # check(start, blocks) raises ValueError if blocks can't replace the
+        # chain from height start up; append() asks before writing a block
+        self._validators.append(check)
+
+    def check_branch(self, start, blocks):
+        for check in self._validators:
+            check(start, blocks)
+
+    def __len__(self):
+        return self.head.length
+
+    def __getitem__(self, height):
+        return self.get(height)
+
+    def __iter__(self):
+        head = self.head
+        for height in range(head.length):
+            yield self.get(height, head)
+
+    def append(self, block, payload=None):
+        # payload, if given, is the block's encoding as received from a peer
+        self.check_branch(len(self), [block])
+        payload = payload or encode_block(block)
+        self._add_index(self._write_record(payload), block)
+        self._publish(block)
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+        for listener in self._listeners:
+            listener.connect(block, len(self) - 1)
+        return len(self) - 1
+
+    def truncate(self, height):
+        # drops every block from height up, for switching to another fork
+        if height >= len(self):
+            return
+        if self._listeners:
+            for dropped_height in range(len(self) - 1, height - 1, -1):
+                block = self.get(dropped_height)
+                for listener in self._listeners:
+                    listener.disconnect(block, dropped_height)
+        tip = self.get(height - 1) if height else None
+        # the dropped records stay in the data file, so mappings held by
+        # readers of the old head stay valid, and the new branch is appended
+        # after a mark saying they are gone. The mark is on disk before the
+        # index shrinks: recovery never sees the cut index without it
+        self._write_record(TRUNCATE_MARK.pack(MARKER, height))
+        os.fsync(self._data)
+        self._cut_index(height)
+        self.sync()
+        self._publish(tip)
+
+    def sync(self):
+        # blocks first, so a durable index entry never points past durable data
+        os.fsync(self._data)
+        os.fsync(self._index)
+        self._unsynced = 0
+
+    def read_raw(self, height, head=None):
+        offset = (head or self.head).offsets[height]
+        length, _ = RECORD_HEADER.unpack(os.pread(self._data, RECORD_HEADER.size, offset))
+        return os.pread(self._data, length, offset + RECORD_HEADER.size)
+
+    def _index_entry(self, height):
+        if height < 0:
+            height += len(self)
+        if not 0 <= height < len(self):
+            raise IndexError('block height out of range')
+        return INDEX_ENTRY.unpack(os.pread(self._index, INDEX_ENTRY.size, height * INDEX_ENTRY.size))
+
+    def hash_at(self, height):
+        return self._index_entry(height)[1].hex()
+
+    def work_at(self, height):
+        # cumulative work of the chain ending at height, without reading blocks
+        return int.from_bytes(self._index_entry(height)[2], 'big')
+
+    def _mapping(self):
+        # remapped whenever appends have grown the file past the mapping
+        if self._map is None or len(self._map) < self._end:
+            self._map = mmap.mmap(self._data, self._end, access=mmap.ACCESS_READ)
+        return self._map
+
+    def iter_raw(self, start=0, stop=None, head=None):
+        # the stored payloads of heights start..stop-1 of head (the current
+        # one by default) as memoryviews into the mapped block file, without
+        # copying or decoding them
+        head = head or self.head
+        stop = head.length if stop is None else min(stop, head.length)
+        start = max(start, 0)
+        if start >= stop:
+            return iter(())
+        return _slice_records(memoryview(self._mapping()), head.offsets, start, stop)
+
+    def get(self, height, head=None):
+        head = head or self.head
+        if height < 0:
+            height += head.length
+        if not 0 <= height < head.length:
+            raise IndexError('block height out of range')
+        if height == head.length - 1 and head.tip is not None:
+            return head.tip
+        return decode_block(self.read_raw(height, head))
+
+    def height_of(self, block_hash):
+        raw_hash = hash_to_bytes(block_hash)
+        height = self._heights.get(raw_hash)
+        if height is None:
+            height = self._scan_index(raw_hash, len(self._offsets) - len(self._recent))
+        return height
+
+    def _scan_index(self, raw_hash, stop):
+        # looks raw_hash up in the index entries below stop, newest first
+        while stop > 0:
+            start = max(stop - HASH_SCAN_ENTRIES, 0)
+            raw = os.pread(self._index, (stop - start) * INDEX_ENTRY.size, start * INDEX_ENTRY.size)
+            found = raw.find(raw_hash)
+            while found >= 0:
+                entry, field = divmod(found, INDEX_ENTRY.size)
+                # the bytes may also turn up inside an offset or a work field
+                if field == HASH_OFFSET:
+                    return start + entry
+                found = raw.find(raw_hash, found + 1)
+            stop = start
+        return None
+
+    def get_by_hash(self, block_hash):
+        height = self.height_of(block_hash)
+        return None if height is None else self.get(height)
+
+    def close(self):
+        if self._data is not None:
+            self.sync()
+            os.close(self._data)
+            os.close(self._index)
+            # the mapping goes away once no response holds a view into it
+            self._data = self._index = self._map = None
+
+
+def _slice_records(view, offsets, start, stop):
+    for height in range(start, stop):
+        offset = offsets[height] + RECORD_HEADER.size
+        length, _ = RECORD_HEADER.unpack_from(view, offset - RECORD_HEADER.size)
+        yield view[offset:offset + length]
@@ -0,0 +1,64 @@
+# the canonical binary format uses unsigned LEB128 varints for counts,
+# lengths and amounts, and utf8 strings prefixed with their length. Readers
+# take file-like streams so blocks can be decoded one at a time off a file
+# or socket
+TRANSACTION_FIELDS = ('from', 'to', 'amount', 'fee', 'nonce')
+
+
+def encode_varint(value):
+    if value < 0:
+        raise ValueError('varints are unsigned')
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise EOFError('truncated data')
+    return data
+
+
+def read_varint(stream):
+    value = 0
+    shift = 0
+    while True:
+        byte = read_exactly(stream, 1)[0]
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value
+        shift += 7
+
+
+def encode_string(text):
+    raw = text.encode('utf8')
+    return encode_varint(len(raw)) + raw
+
+
+def read_string(stream):
+    return read_exactly(stream, read_varint(stream)).decode('utf8')
+
+
+def encode_transaction(transaction):
+    # fee and nonce default to 0, so both spellings encode (and hash) the same
+    return b''.join([
+        encode_string(transaction['from']),
+        encode_string(transaction['to']),
+        encode_varint(transaction['amount']),
+        encode_varint(transaction.get('fee', 0)),
+        encode_varint(transaction.get('nonce', 0))
+    ])
+
+
+def read_transaction(stream):
+    return {
+        'from': read_string(stream),
+        'to': read_string(stream),
+        'amount': read_varint(stream),
+        'fee': read_varint(stream),
+        'nonce': read_varint(stream)
+    }
@@ -1,6 +1,9 @@
-
 import datetime as date
+import os
 from snake_coin import *
+from block_store import BlockStore
+
+CHAIN_PATH = os.environ.get('SNAKE_COIN_CHAIN', 'chain.dat')
 
 
 def create_genesis_block():
@@ -15,52 +18,23 @@ def next_block(last_block):
     return Block(this_index, this_timestamp, this_data, this_hash)
 
 
-block_chain = [create_genesis_block()]
-previous_block = block_chain[0]
-print('Genesis Block added!')
-print('Hash: {}'.format(block_chain[0].hash))
-
-num_blocks = 20
-for i in range(num_blocks):
-    block_to_add = next_block(previous_block)
-    block_chain.append(block_to_add)
-    previous_block = block_to_add
-    print('Block #{} has been added to the block chain!'.format(block_to_add.index))
-    print('Hash: {}'.format(block_to_add.hash))
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+# blocks live on disk, the node only keeps their offsets in memory
+block_chain = BlockStore(CHAIN_PATH)
+if not len(block_chain):
+    block_chain.append(create_genesis_block())
 
 
+if __name__ == '__main__':
+    previous_block = block_chain[-1]
+    print('Chain has {} blocks'.format(len(block_chain)))
+    print('Hash: {}'.format(previous_block.hash))
 
+    num_blocks = 20
+    for i in range(num_blocks):
+        block_to_add = next_block(previous_block)
+        block_chain.append(block_to_add)
+        previous_block = block_to_add
+        print('Block #{} has been added to the block chain!'.format(block_to_add.index))
+        print('Hash: {}'.format(block_to_add.hash))
+    block_chain.close()
 
@@ -0,0 +1,67 @@
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from snake_coin import HEADER_SIZE, hash_meets_target, iter_blocks, parse_header
+
+# headers hashed per worker task
+HEADER_CHUNK = 500
+
+
+def verify_headers(raw):
+    # worker: hashes a run of raw headers and checks each one's proof of
+    # work, returns the parsed headers or None if any of them fails
+    headers = [parse_header(raw[offset:offset + HEADER_SIZE]) for offset in range(0, len(raw), HEADER_SIZE)]
+    for header in headers:
+        if not hash_meets_target(header.hash, header.bits):
+            return None
+    return headers
+
+
+def decode_blocks(raw):
+    # worker: decodes back to back blocks, which rebuilds their merkle roots
+    # and hashes, and returns them with the offset where each one ends
+    stream = io.BytesIO(raw)
+    blocks = []
+    ends = []
+    for block in iter_blocks(stream):
+        blocks.append(block)
+        ends.append(stream.tell())
+    return blocks, ends
+
+
+class Verifier:
+    # the hashing stage of block ingestion: sync decodes responses into
+    # raw headers and blocks, the verifier hashes them on a process pool as
+    # each response arrives, and sync then link-checks and applies them in
+    # order on the event loop
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+
+    def _run(self, function, raw):
+        # with one core a thread keeps the event loop free without the cost
+        # of shipping the data to another process
+        if self._pool is None and self.workers > 1:
+            self._pool = ProcessPoolExecutor(self.workers)
+        return asyncio.get_running_loop().run_in_executor(self._pool, function, raw)
+
+    async def headers(self, raw):
+        step = HEADER_CHUNK * HEADER_SIZE
+        chunks = await asyncio.gather(*[self._run(verify_headers, raw[first:first + step])
+                                        for first in range(0, len(raw), step)])
+        if any(chunk is None for chunk in chunks):
+            raise ValueError('header without valid proof of work')
+        return [header for chunk in chunks for header in chunk]
+
+    async def blocks(self, raw):
+        # returns [(block, its encoded payload)]
+        blocks, ends = await self._run(decode_blocks, raw)
+        return list(zip(blocks, [raw[start:end] for start, end in zip([0] + ends, ends)]))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,165 @@
+import heapq
+import itertools
+from collections import defaultdict
+
+import merkle
+from encoding import TRANSACTION_FIELDS, encode_transaction
+
+# the sender of block rewards, it creates coins instead of spending them;
+# a block pays its miner at most BLOCK_REWARD plus its transactions' fees
+COINBASE = 'network'
+BLOCK_REWARD = 1
+# most transactions waiting in the pool, and most bytes of their encoding
+# taken into one block
+MAX_TRANSACTIONS = 10000
+MAX_BLOCK_BYTES = 64 * 1024
+
+
+def transaction_id(transaction):
+    return merkle.hash_transaction(transaction).hex()
+
+
+def transaction_fee(transaction):
+    return transaction.get('fee', 0)
+
+
+def transaction_cost(transaction):
+    # what the sender pays: the amount sent plus the fee to the miner
+    return transaction['amount'] + transaction_fee(transaction)
+
+
+def check_transaction(transaction):
+    # only what encode_transaction can represent is accepted
+    if not isinstance(transaction, dict):
+        raise ValueError('transaction must be an object')
+    for field in transaction:
+        if field not in TRANSACTION_FIELDS:
+            raise ValueError('unknown field: ' + str(field))
+    for field in ('from', 'to', 'amount'):
+        if field not in transaction:
+            raise ValueError('missing field: ' + field)
+    for field in ('from', 'to'):
+        if not isinstance(transaction[field], str):
+            raise ValueError('bad ' + field)
+    for field in ('amount', 'fee', 'nonce'):
+        value = transaction.get(field, 0)
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError('bad ' + field)
+
+
+class Mempool:
+    # pending transactions indexed by id and by sender; when full the
+    # lowest fee entry is evicted to make room for a better paying one.
+    # As a listener of the chain it drops the transactions of connected
+    # blocks and takes back those of blocks a reorg disconnects
+
+    def __init__(self, max_transactions=MAX_TRANSACTIONS):
+        self.max_transactions = max_transactions
+        self._transactions = {}
+        self._senders = defaultdict(set)
+        self._pending = defaultdict(int)
+        # (fee, arrival, id) min-heap; entries of removed transactions are
+        # skipped when they reach the top
+        self._fees = []
+        self._arrival = {}
+        self._sizes = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._transactions)
+
+    def __contains__(self, txid):
+        return txid in self._transactions
+
+    def get(self, txid):
+        return self._transactions.get(txid)
+
+    def by_sender(self, sender):
+        return [self._transactions[txid] for txid in self._senders.get(sender, ())]
+
+    def pending(self, sender):
+        # total the sender's waiting transactions will spend
+        return self._pending.get(sender, 0)
+
+    def _lowest(self):
+        while self._fees:
+            fee, arrival, txid = self._fees[0]
+            if self._arrival.get(txid) == arrival:
+                return fee, txid
+            heapq.heappop(self._fees)
+        return None
+
+    def add(self, transaction):
+        check_transaction(transaction)
+        txid = transaction_id(transaction)
+        if txid in self._transactions:
+            raise ValueError('duplicate transaction')
+        fee = transaction_fee(transaction)
+        if len(self._transactions) >= self.max_transactions:
+            lowest_fee, lowest = self._lowest()
+            if fee <= lowest_fee:
+                raise ValueError('mempool full, fee too low')
+            self.remove(lowest)
+        arrival = next(self._counter)
+        self._transactions[txid] = transaction
+        self._senders[transaction['from']].add(txid)
+        self._pending[transaction['from']] += transaction_cost(transaction)
+        self._arrival[txid] = arrival
+        self._sizes[txid] = len(encode_transaction(transaction))
+        heapq.heappush(self._fees, (fee, arrival, txid))
+        return txid
+
+    def remove(self, txid):
+        transaction = self._transactions.pop(txid, None)
+        if transaction is None:
+            return None
+        del self._arrival[txid]
+        del self._sizes[txid]
+        senders = self._senders[transaction['from']]
+        senders.discard(txid)
+        self._pending[transaction['from']] -= transaction_cost(transaction)
+        if not senders:
+            del self._senders[transaction['from']]
+            del self._pending[transaction['from']]
+        # drop stale heap entries once they outnumber the live ones
+        if len(self._fees) > 2 * len(self._transactions) + 64:
+            self._fees = [entry for entry in self._fees if self._arrival.get(entry[2]) == entry[1]]
+            heapq.heapify(self._fees)
+        return transaction
+
+    def remove_transactions(self, transactions):
+        for transaction in transactions:
+            self.remove(transaction_id(transaction))
+
+    def connect(self, block, height):
+        self.remove_transactions(block.transactions)
+
+    def disconnect(self, block, height):
+        for transaction in block.transactions:
+            if transaction['from'] == COINBASE:
+                continue
+            try:
+                self.add(transaction)
+            except ValueError:
+                # already back in the pool, or it no longer pays enough
+                pass
+
+    def select(self, max_bytes=MAX_BLOCK_BYTES, can_spend=None):
+        # highest fees first, earlier arrivals first among equal fees, as
+        # long as they fit in max_bytes; with can_spend(sender, amount),
+        # transactions the sender can no longer pay for stay behind
+        selected = []
+        size = 0
+        spent = defaultdict(int)
+        for txid, _ in sorted(self._arrival.items(),
+                              key=lambda item: (-transaction_fee(self._transactions[item[0]]), item[1])):
+            transaction = self._transactions[txid]
+            sender = transaction['from']
+            if size + self._sizes[txid] > max_bytes:
+                continue
+            if can_spend is not None and not can_spend(sender, spent[sender] + transaction_cost(transaction)):
+                continue
+            selected.append(transaction)
+            size += self._sizes[txid]
+            spent[sender] += transaction_cost(transaction)
+        return selected
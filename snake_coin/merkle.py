@@ -0,0 +1,60 @@
+import hashlib as hasher
+
+from encoding import encode_transaction
+
+# leaves and inner nodes are hashed with different prefixes so an inner
+# node can never be passed off as a transaction
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def hash_leaf(payload):
+    return hasher.sha256(LEAF_PREFIX + payload).digest()
+
+
+def hash_node(left, right):
+    return hasher.sha256(NODE_PREFIX + left + right).digest()
+
+
+def hash_transaction(transaction):
+    return hash_leaf(encode_transaction(transaction))
+
+
+def merkle_levels(leaves):
+    # levels[0] are the leaves, levels[-1] holds the root; a node without
+    # a sibling is carried up unchanged instead of being paired with itself
+    levels = [list(leaves) or [hasher.sha256(b'').digest()]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [hash_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def merkle_root(leaves):
+    return merkle_levels(leaves)[-1][0]
+
+
+def merkle_proof(levels, index):
+    # sibling hashes from the leaf up, as (hex hash, side of the sibling)
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append((level[sibling].hex(), 'left' if sibling < index else 'right'))
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf, proof, root):
+    node = leaf
+    for sibling, side in proof:
+        sibling = bytes.fromhex(sibling)
+        node = hash_node(sibling, node) if side == 'left' else hash_node(node, sibling)
+    return node == root
+
+
+def verify_transaction(transaction, proof, root):
+    return verify_proof(hash_transaction(transaction), proof, root)
@@ -0,0 +1,103 @@
+import hashlib as hasher
+import multiprocessing
+import os
+import queue
+import time
+from collections import namedtuple
+
+from snake_coin import NONCE
+
+BATCH_SIZE = 20000
+# seconds between checks of the caller's stop event while workers search
+STOP_POLL = 0.1
+
+MiningResult = namedtuple('MiningResult', ['nonce', 'hash', 'hashes', 'seconds'])
+
+
+def hashes_per_second(result):
+    return result.hashes / result.seconds if result.seconds else 0.0
+
+
+def search_nonces(prefix, bits, start, step, stop=None, limit=None):
+    # tries start, start + step, start + 2 * step, ... until a hash of
+    # prefix + nonce has `bits` leading zero bits, `stop` is set by
+    # another worker or `limit` nonces were tried
+    if bits == 0:
+        # 2 ** 256 does not fit in 32 bytes, but every digest sorts below this
+        target = b'\xff' * 33
+    else:
+        target = (1 << (256 - bits)).to_bytes(32, 'big')
+    # hash the fixed prefix once, each attempt only hashes the nonce
+    midstate = hasher.sha256(prefix)
+    pack_nonce = NONCE.pack
+    nonce = start
+    hashes = 0
+    while stop is None or not stop.is_set():
+        for _ in range(BATCH_SIZE):
+            sha = midstate.copy()
+            sha.update(pack_nonce(nonce))
+            digest = sha.digest()
+            hashes += 1
+            if digest < target:
+                return nonce, digest.hex(), hashes
+            nonce += step
+        if limit is not None and hashes >= limit:
+            break
+    return None, None, hashes
+
+
+def _worker(prefix, bits, start, step, stop, results):
+    nonce, block_hash, hashes = search_nonces(prefix, bits, start, step, stop)
+    if nonce is not None:
+        stop.set()
+    results.put((nonce, block_hash, hashes))
+
+
+def mine(prefix, bits, workers=None, stop=None):
+    # splits the nonce space between `workers` processes (worker i tries
+    # i, i + workers, ...), the first hit cancels the others. Setting the
+    # multiprocessing.Event `stop` from outside gives up the search, the
+    # result then has no nonce
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    if workers == 1 or bits == 0:
+        nonce, block_hash, hashes = search_nonces(prefix, bits, 0, 1, stop)
+        return MiningResult(nonce, block_hash, hashes, time.perf_counter() - started)
+
+    # the workers set `done` on a hit; it is separate from `stop` so a found
+    # block does not cancel the caller's later searches
+    done = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_worker, args=(prefix, bits, i, workers, done, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.daemon = True
+        process.start()
+    found = None
+    total_hashes = 0
+    reported = 0
+    while reported < len(processes):
+        try:
+            nonce, block_hash, hashes = results.get(timeout=STOP_POLL)
+        except queue.Empty:
+            if stop is not None and stop.is_set():
+                done.set()
+            continue
+        reported += 1
+        total_hashes += hashes
+        if nonce is not None and (found is None or nonce < found[0]):
+            found = (nonce, block_hash)
+    for process in processes:
+        process.join()
+    found = found or (None, None)
+    return MiningResult(found[0], found[1], total_hashes, time.perf_counter() - started)
+
+
+def mine_block(block, bits=None, workers=None, stop=None):
+    if bits is not None:
+        block.bits = bits
+    result = mine(block.header_prefix(), block.bits, workers, stop)
+    if result.nonce is not None:
+        block.nonce = result.nonce
+        block.hash = result.hash
+    return result
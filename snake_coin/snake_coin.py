@@ -1,20 +1,162 @@
 
+import datetime as date
 import hashlib as hasher
+import io
+import struct
+from collections import namedtuple
+
+import merkle
+from encoding import (encode_string, encode_transaction, encode_varint, read_exactly, read_string,
+                      read_transaction, read_varint)
+
+VERSION = 1
+EPOCH = date.datetime(1970, 1, 1)
+# version, index, timestamp (microseconds), previous hash, merkle root, bits;
+# the nonce is appended last so miners can hash this prefix only once
+HEADER_PREFIX = struct.Struct('>IQq32s32sI')
+NONCE = struct.Struct('>Q')
+HEADER_SIZE = HEADER_PREFIX.size + NONCE.size
+
+# a block is encoded as its header followed by its data, which is either
+# free text or a list of transactions
+TEXT_DATA = 0
+TRANSACTION_DATA = 1
+
+Header = namedtuple('Header', ['version', 'index', 'timestamp', 'previous_hash', 'merkle_root',
+                               'bits', 'nonce', 'hash'])
+
+
+def hash_to_bytes(block_hash):
+    return bytes.fromhex(str(block_hash).rjust(64, '0'))
+
+
+def timestamp_to_micros(timestamp):
+    if isinstance(timestamp, date.datetime):
+        return (timestamp - EPOCH) // date.timedelta(microseconds=1)
+    return int(timestamp)
+
+
+def micros_to_timestamp(micros):
+    return EPOCH + date.timedelta(microseconds=micros)
+
+
+def parse_header(raw):
+    # previous_hash and merkle_root stay raw bytes, hash is the hex digest
+    fields = HEADER_PREFIX.unpack_from(raw)
+    nonce, = NONCE.unpack_from(raw, HEADER_PREFIX.size)
+    return Header(*fields, nonce, hasher.sha256(raw[:HEADER_SIZE]).hexdigest())
+
+
+def block_work(bits):
+    # expected number of hashes it took to find a block at this difficulty
+    return 1 << bits
+
+
+def hash_meets_target(block_hash, bits):
+    # the hash, read as a 256-bit number, must start with `bits` zero bits
+    return int(block_hash, 16) >> (256 - bits) == 0
 
 
 class Block:
-    def __init__(self, index, timestamp, data, previous_hash):
+    def __init__(self, index, timestamp, data, previous_hash, nonce=0, bits=0):
         self.index = index
         self.timestamp = timestamp
         self.data = data
         self.previous_hash = previous_hash
+        self.bits = bits
+        self.nonce = nonce
+        # the payload is committed through a merkle root computed once per
+        # block, the header only carries the root
+        self._merkle_levels = merkle.merkle_levels(self.leaves())
+        self.merkle_root = self._merkle_levels[-1][0]
         self.hash = self.hash_block()
 
+    @property
+    def transactions(self):
+        if isinstance(self.data, dict):
+            return self.data.get('transactions', [])
+        return []
+
+    def leaves(self):
+        if isinstance(self.data, dict) and 'transactions' in self.data:
+            return [merkle.hash_transaction(transaction) for transaction in self.data['transactions']]
+        return [merkle.hash_leaf(str(self.data).encode('utf8'))]
+
+    def merkle_proof(self, transaction_index):
+        return merkle.merkle_proof(self._merkle_levels, transaction_index)
+
+    def header_prefix(self):
+        # everything the hash commits to except the nonce, which comes last
+        return HEADER_PREFIX.pack(VERSION, self.index, timestamp_to_micros(self.timestamp),
+                                  hash_to_bytes(self.previous_hash), self.merkle_root, self.bits)
+
+    def header(self):
+        return self.header_prefix() + NONCE.pack(self.nonce)
+
     def hash_block(self):
         sha = hasher.sha256()
-        sha.update((str(self.index) + str(self.timestamp) + str(self.data) + str(self.previous_hash)).encode('utf8'))
+        sha.update(self.header())
         return sha.hexdigest()
 
+    def has_valid_proof(self):
+        return self.hash == self.hash_block() and hash_meets_target(self.hash, self.bits)
+
+
+def encode_block(block):
+    if isinstance(block.data, dict):
+        if list(block.data) != ['transactions']:
+            raise ValueError('unsupported block data')
+        transactions = block.data['transactions']
+        body = [bytes([TRANSACTION_DATA]), encode_varint(len(transactions))]
+        body.extend(encode_transaction(transaction) for transaction in transactions)
+    elif isinstance(block.data, str):
+        body = [bytes([TEXT_DATA]), encode_string(block.data)]
+    else:
+        raise ValueError('unsupported block data')
+    return block.header() + b''.join(body)
+
+
+def write_block(stream, block):
+    # blocks written back to back read back with read_block or iter_blocks
+    stream.write(encode_block(block))
+
+
+def read_block(stream):
+    # reads one block, or returns None at the end of the stream
+    raw = stream.read(HEADER_SIZE)
+    if not raw:
+        return None
+    if len(raw) != HEADER_SIZE:
+        raise EOFError('truncated block header')
+    header = parse_header(raw)
+    if header.version != VERSION:
+        raise ValueError('unsupported block version {}'.format(header.version))
+    kind = read_exactly(stream, 1)[0]
+    if kind == TEXT_DATA:
+        data = read_string(stream)
+    elif kind == TRANSACTION_DATA:
+        data = {'transactions': [read_transaction(stream) for _ in range(read_varint(stream))]}
+    else:
+        raise ValueError('unknown block data type {}'.format(kind))
+    block = Block(header.index, micros_to_timestamp(header.timestamp), data,
+                  header.previous_hash.hex(), header.nonce, header.bits)
+    # the rebuilt header (and with it the merkle root) must hash the same
+    if block.hash != header.hash:
+        raise ValueError('block data does not match its header')
+    return block
+
+
+def decode_block(payload):
+    return read_block(io.BytesIO(payload))
+
+
+def iter_blocks(stream):
+    while True:
+        block = read_block(stream)
+        if block is None:
+            return
+        yield block
+
 
 
 
@@ -1,117 +1,286 @@
 
-from flask import Flask
-from flask import request
+from aiohttp import web
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from genesis import *
+from balances import BalanceIndex
+import argparse
+import ingest
+import asyncio
 import json
+import mining
+import multiprocessing
+import traceback
+from mempool import BLOCK_REWARD, Mempool, check_transaction, transaction_cost, transaction_fee
+import sync
+
+routes = web.RouteTableDef()
+mempool = Mempool()
+balances = BalanceIndex(block_chain)
+block_chain.add_listener(mempool)
+peer_nodes = []
+# seconds between two sync rounds with peer_nodes
+sync_interval = 30
+verify_workers = None  # processes hashing synced blocks, one per core
+
+
+def text_response(text, status=200):
+    return web.Response(text=text, status=status)
+
+
+def json_response(fields):
+    return web.Response(text=json.dumps(fields) + '\n', content_type='application/json')
+
+
+@routes.post('/txion')
+async def transaction(request):
+    try:
+        new_txion = await request.json()
+    except ValueError:
+        new_txion = None
+    try:
+        check_transaction(new_txion)
+        # confirmed balance less what the sender's pending transactions spend
+        sender = new_txion['from']
+        if not balances.can_spend(sender, transaction_cost(new_txion) + mempool.pending(sender)):
+            raise ValueError('insufficient funds')
+        mempool.add(new_txion)
+    except ValueError as error:
+        return text_response('Transaction rejected: {}\n'.format(error), 400)
+    print('New transaction')
+    print('From: {}'.format(new_txion['from']))
+    print('To: {}'.format(new_txion['to']))
+    print('Amount: {}'.format(new_txion['amount']))
+    return text_response('Transaction submission successful\n')
 
-node = Flask(__name__)
-this_nodes_transactions = []
 
-
-@node.route('/txion', methods=['POST'])
-def transaction():
-    if request.method == 'POST':
-        new_txion = request.get_json()
-        this_nodes_transactions.append(new_txion)
-        print('New transaction')
-        print('From: {}'.format(new_txion['from']))
-        print('To: {}'.format(new_txion['to']))
-        print('Amount: {}'.format(new_txion['amount']))
-        return 'Transaction submission successful\n'
+miner_address = 'q3nf394hjg-random-miner-address-34nf3i4nflkn3oi'
+# leading zero bits the block hash needs
+difficulty_bits = 20
+mining_workers = None  # one per core
+# the nonce search runs here so the event loop keeps serving requests, one
+# block at a time; setting stop_mining abandons it on shutdown
+mining_executor = ThreadPoolExecutor(max_workers=1)
+mining_lock = asyncio.Lock()
+stop_mining = multiprocessing.Event()
 
 
-node.run()
+def proof_of_work(block):
+    return mining.mine_block(block, difficulty_bits, mining_workers, stop_mining)
 
-miner_address = 'q3nf394hjg-random-miner-address-34nf3i4nflkn3oi'
 
+@routes.get('/mine')
+async def mine(request):
+    async with mining_lock:
+        return await mine_next_block()
 
-def proof_of_work(last_proof):
-    incrementor = last_proof + 1
-    while not (incrementor % 9 == 0) and (incrementor % last_proof == 0):
-        incrementor += 1
-    return incrementor
 
-
-@node.route('/mine', methods=['GET'])
-def mine():
+async def mine_next_block():
     last_block = block_chain[-1]
-    last_proof = last_block.data['proof-of-work']
-    proof = proof_of_work(last_proof)
-    this_nodes_transactions.append(
-        {'from': 'network', 'to': miner_address, 'amount': 1})
+    # best paying transactions first, the miner collects their fees; the
+    # balances may have changed since they were accepted (a synced block
+    # can spend the same coins), so they are checked again
+    transactions = mempool.select(can_spend=balances.can_spend)
+    reward = BLOCK_REWARD + sum(transaction_fee(transaction) for transaction in transactions)
     new_block_data = {
-        'proof-of-work': proof,
-        'transactions': list(this_nodes_transactions)
+        'transactions': transactions + [{'from': 'network', 'to': miner_address, 'amount': reward}]
     }
     new_block_index = last_block.index + 1
     new_block_timestamp = date.datetime.now()
     last_block_hash = last_block.hash
-    this_nodes_transactions[:] = []
     mined_block = Block(new_block_index, new_block_timestamp, new_block_data, last_block_hash)
+    result = await asyncio.get_running_loop().run_in_executor(mining_executor, proof_of_work, mined_block)
+    if result.nonce is None:
+        return text_response('Mining stopped\n', 503)
+    # a sync round may have replaced the tip while the block was mined
+    if block_chain.hash_at(-1) != last_block_hash:
+        return text_response('Chain changed while mining, block dropped\n', 409)
+    # the mempool drops the block's transactions as it is connected
     block_chain.append(mined_block)
-    return json.dumps(
+    return json_response(
         {
             'index': new_block_index,
             'timestamp': str(new_block_timestamp),
             'data': new_block_data,
-            'hash': last_block_hash
+            'previous_hash': last_block_hash,
+            'bits': mined_block.bits,
+            'nonce': mined_block.nonce,
+            'hash': mined_block.hash,
+            'hashes_per_second': mining.hashes_per_second(result)
         }
-    ) + '\n'
-
-
-@node.route('/blocks', methods=['GET'])
-def get_blocks():
-    chain_to_send = block_chain
-    for block in chain_to_send:
-        block_index = str(block.index)
-        block_timestamp = str(block.timestamp)
-        block_data = str(block.data)
-        block_hash = block.hash
-        block = {
-            'index': block_index,
-            'timestamp': block_timestamp,
-            'data': block_data,
-            'hash': block_hash
+    )
+
+
+# bytes of block records joined into one chunk of a /blocks response
+STREAM_CHUNK = 64 * 1024
+
+
+def stream_blocks(start, stop, head):
+    # the store keeps every block in its binary wire encoding, which is
+    # self-delimiting, so the response is just slices of the mapped block
+    # file back to back
+    chunk = []
+    size = 0
+    for payload in block_chain.iter_raw(start, stop, head):
+        chunk.append(payload)
+        size += len(payload)
+        if size >= STREAM_CHUNK:
+            yield b''.join(chunk)
+            chunk = []
+            size = 0
+    yield b''.join(chunk)
+
+
+@routes.get('/blocks')
+async def get_blocks(request):
+    # ?from=&to= selects heights from <= height < to, sent with chunked
+    # transfer encoding as the chunks are cut. The response is cut from the
+    # head current when it started, even if blocks are mined or a reorg
+    # happens while it is still being written
+    head = block_chain.head
+    try:
+        start = int(request.query.get('from', 0))
+        stop = int(request.query.get('to', head.length))
+    except ValueError:
+        return text_response('Bad block range\n', 400)
+    response = web.StreamResponse(headers={'Content-Type': 'application/octet-stream'})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    for chunk in stream_blocks(start, stop, head):
+        await response.write(chunk)
+    await response.write_eof()
+    return response
+
+
+@routes.get('/balance/{address}')
+async def get_balance(request):
+    address = request.match_info['address']
+    return json_response(
+        {
+            'address': address,
+            'balance': balances.balance(address),
+            'pending': mempool.pending(address)
         }
-    chain_to_send = json.dumps(chain_to_send)
-    return chain_to_send
-
-
-def find_new_chains():
-    other_chains = []
-    for node_url in peer_nodes:
-        block = requests.get(node_url + '/blocks').content
-        block = json.loads(block)
-        other_chains.append(block)
-    return other_chains
-
-
-def consensus():
-    other_chains = find_new_chains()
-    longest_chain = block_chain
-    for chain in other_chains:
-        if len(longest_chain) < len(chain):
-            longest_chain = chain
-    block_chain = longest_chain
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    )
+
+
+@routes.get(r'/proof/{height:\d+}/{transaction_index:\d+}')
+async def get_proof(request):
+    # lets a light client check that a transaction is in a block with only
+    # the block header and O(log n) hashes
+    height = int(request.match_info['height'])
+    transaction_index = int(request.match_info['transaction_index'])
+    if height >= len(block_chain):
+        return text_response('Unknown block\n', 404)
+    block = block_chain[height]
+    if transaction_index >= len(block.transactions):
+        return text_response('Unknown transaction\n', 404)
+    return json_response(
+        {
+            'transaction': block.transactions[transaction_index],
+            'proof': block.merkle_proof(transaction_index),
+            'merkle_root': block.merkle_root.hex(),
+            'header': block.header().hex(),
+            'hash': block.hash
+        }
+    )
+
+
+@routes.get('/headers')
+async def get_headers(request):
+    # headers after the first block of ?locator= (comma separated hashes,
+    # newest first) that this node has, at most ?limit= of them: the start
+    # height, then the raw headers, which are the first bytes of each record
+    locator = [block_hash for block_hash in request.query.get('locator', '').split(',') if block_hash]
+    try:
+        limit = min(int(request.query.get('limit', sync.MAX_HEADERS)), sync.MAX_HEADERS)
+        start = sync.locate(block_chain, locator)
+    except ValueError:
+        return text_response('Bad locator\n', 400)
+    headers = [payload[:HEADER_SIZE] for payload in block_chain.iter_raw(start, start + limit)]
+    return web.Response(body=sync.HEADERS_START.pack(start) + b''.join(headers),
+                        content_type='application/octet-stream')
+
+
+async def consensus(session, verifier):
+    # only headers past the common ancestor and the bodies of a branch with
+    # more work are downloaded, never a peer's whole chain
+    return await sync.sync_chain(block_chain, peer_nodes, session, verifier)
+
+
+async def sync_forever(app):
+    # a failed round is logged and the next one runs as usual, only
+    # cancelling the task at shutdown ends the loop
+    while True:
+        await asyncio.sleep(sync_interval)
+        if not peer_nodes:
+            continue
+        try:
+            await consensus(app['session'], app['verifier'])
+        except BrokenProcessPool:
+            print('Sync failed, a verifier process died')
+            traceback.print_exc()
+            # the next round starts a fresh pool
+            app['verifier'].close()
+        except Exception:
+            print('Sync failed')
+            traceback.print_exc()
+
+
+async def start_node(app):
+    # one pooled session for every sync round, so peer connections stay open
+    app['session'] = sync.new_session()
+    app['verifier'] = ingest.Verifier(verify_workers)
+    app['sync'] = asyncio.create_task(sync_forever(app))
+
+
+async def stop_mining_on_shutdown(app):
+    # runs before the server waits for open requests, so a /mine in
+    # progress answers at once instead of holding up the shutdown
+    stop_mining.set()
+
+
+async def stop_node(app):
+    # after the last request: stop syncing, then flush the chain and balances
+    app['sync'].cancel()
+    await app['session'].close()
+    app['verifier'].close()
+    mining_executor.shutdown(wait=True)
+    balances.snapshot()
+    block_chain.close()
+
+
+def create_app():
+    app = web.Application()
+    app.add_routes(routes)
+    app.on_startup.append(start_node)
+    app.on_shutdown.append(stop_mining_on_shutdown)
+    app.on_cleanup.append(stop_node)
+    return app
+
+
+def main():
+    global difficulty_bits, mining_workers, sync_interval, verify_workers
+    parser = argparse.ArgumentParser(description='Run a snake_coin node.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=mining_workers,
+                        help='mining processes (default: one per core)')
+    parser.add_argument('--bits', type=int, default=difficulty_bits, help='proof of work difficulty')
+    parser.add_argument('--peer', action='append', default=[], help='url of a peer node, may be repeated')
+    parser.add_argument('--sync-interval', type=float, default=sync_interval,
+                        help='seconds between sync rounds with the peers')
+    parser.add_argument('--verify-workers', type=int, default=verify_workers,
+                        help='processes hashing blocks received from peers (default: one per core)')
+    args = parser.parse_args()
+    difficulty_bits = args.bits
+    mining_workers = args.workers
+    sync_interval = args.sync_interval
+    verify_workers = args.verify_workers
+    peer_nodes.extend(args.peer)
+    # SIGINT and SIGTERM run stop_node before the process exits
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+import asyncio
+import struct
+
+import aiohttp
+
+from ingest import Verifier
+from snake_coin import HEADER_SIZE, block_work, decode_block, hash_meets_target, hash_to_bytes
+
+# most headers a node sends per /headers request
+MAX_HEADERS = 2000
+# a /headers response is the start height followed by the raw headers
+HEADERS_START = struct.Struct('>Q')
+BODY_BATCH = 500
+# requests in flight at once, over at most this many pooled connections
+MAX_CONCURRENT = 16
+# seconds a single peer gets to answer one request
+PEER_TIMEOUT = 5
+# what a slow, unreachable or misbehaving peer can fail with
+PEER_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError, EOFError)
+
+
+def block_locator(chain):
+    # hashes of the last 10 blocks, then with doubling gaps back to genesis,
+    # so a peer can find the common ancestor in O(log n) hashes
+    heights = []
+    height = len(chain) - 1
+    step = 1
+    while height > 0:
+        heights.append(height)
+        if len(heights) >= 10:
+            step *= 2
+        height -= step
+    heights.append(0)
+    return [chain.hash_at(height) for height in heights]
+
+
+def locate(chain, locator):
+    # first height after the most recent locator block we also have
+    for block_hash in locator:
+        height = chain.height_of(block_hash)
+        if height is not None:
+            return height + 1
+    return 0
+
+
+async def get_bytes(session, limit, url, params):
+    async with limit:
+        async with session.get(url, params=params) as response:
+            response.raise_for_status()
+            return await response.read()
+
+
+async def fetch_headers(session, limit, verifier, node_url, locator):
+    # one page of the peer's headers after the first locator block it has:
+    # (start height, headers), hashed by the verifier
+    response = await get_bytes(session, limit, node_url + '/headers',
+                               {'locator': ','.join(locator), 'limit': MAX_HEADERS})
+    if (len(response) - HEADERS_START.size) % HEADER_SIZE:
+        raise ValueError('truncated headers')
+    start, = HEADERS_START.unpack_from(response)
+    return start, await verifier.headers(response[HEADERS_START.size:])
+
+
+async def scan_headers(session, limit, verifier, node_url, chain, locator):
+    # walks the peer's branch past the common ancestor one page at a time,
+    # link-checking each page against the last, and returns (start, work
+    # the branch claims) or None if it doesn't hold together. Only the
+    # last header of a page is kept, so a long branch costs no memory
+    start, headers = await fetch_headers(session, limit, verifier, node_url, locator)
+    if not validate_headers(chain, start, headers):
+        return None
+    work = branch_work(chain, start, headers)
+    while len(headers) == MAX_HEADERS:
+        last = headers[-1]
+        height, headers = await fetch_headers(session, limit, verifier, node_url, [last.hash])
+        if height != last.index + 1 or not link_headers(hash_to_bytes(last.hash), height, headers):
+            return None
+        work += sum(block_work(header.bits) for header in headers)
+    return start, work
+
+
+def branch_work(chain, start, headers):
+    # cumulative work of the chain the peer claims: ours up to the fork,
+    # then the work of each of its headers
+    work = chain.work_at(start - 1) if 0 < start <= len(chain) else 0
+    return work + sum(block_work(header.bits) for header in headers)
+
+
+def validate_headers(chain, start, headers):
+    # our own blocks were validated when they were stored, so only the
+    # headers past the fork point are checked. The hashing was done by the
+    # verifier, this is the serial link check
+    if start > len(chain):
+        return False
+    return link_headers(hash_to_bytes(chain.hash_at(start - 1)) if start else None, start, headers)
+
+
+def link_headers(previous, start, headers):
+    # headers must follow the block hashing to previous (None: genesis)
+    # at heights start, start + 1, ... and meet their own targets
+    for height, header in enumerate(headers, start):
+        if header.index != height or not hash_meets_target(header.hash, header.bits):
+            return False
+        if previous is not None and header.previous_hash != previous:
+            return False
+        previous = hash_to_bytes(header.hash)
+    return True
+
+
+async def fetch_blocks(session, limit, verifier, node_url, start, stop):
+    response = await get_bytes(session, limit, node_url + '/blocks', {'from': start, 'to': stop})
+    return await verifier.blocks(response)
+
+
+async def fetch_bodies(session, limit, verifier, node_url, start, headers):
+    # bodies are requested in parallel batches and each batch is decoded by
+    # the verifier as soon as it arrives; a block is only accepted if it
+    # hashes to the header already validated for its height
+    stop = start + len(headers)
+    batches = await asyncio.gather(*[fetch_blocks(session, limit, verifier, node_url,
+                                                  first, min(first + BODY_BATCH, stop))
+                                     for first in range(start, stop, BODY_BATCH)])
+    blocks = [block for batch in batches for block in batch]
+    if len(blocks) != len(headers):
+        return None
+    for (block, _), header in zip(blocks, headers):
+        if block.hash != header.hash:
+            return None
+    return blocks
+
+
+async def poll_peers(session, limit, verifier, peers, chain, locator):
+    # asks every peer at once; a peer that fails, times out or sends a
+    # broken branch maps to None instead of holding up the round
+    async def poll(node_url):
+        try:
+            return await scan_headers(session, limit, verifier, node_url, chain, locator)
+        except PEER_ERRORS:
+            return None
+    return await asyncio.gather(*[poll(node_url) for node_url in peers])
+
+
+async def apply_branch(session, limit, verifier, chain, node_url, start, locator):
+    # downloads the peer's branch MAX_HEADERS blocks at a time: each window
+    # of headers is link-checked, its bodies fetched, matched against the
+    # headers and checked by the chain's validators, then appended. Our
+    # own blocks past the fork are only dropped once the first window has
+    # passed all of that. Returns False if the peer stops making sense
+    tip = chain.hash_at(-1)
+    height = start
+    while True:
+        window_start, headers = await fetch_headers(session, limit, verifier, node_url, locator)
+        # a block may have been mined, or the peer moved, while we waited
+        if window_start != height or chain.hash_at(-1) != tip or not validate_headers(chain, height, headers):
+            return False
+        if not headers:
+            return height > start
+        blocks = await fetch_bodies(session, limit, verifier, node_url, height, headers)
+        if blocks is None or chain.hash_at(-1) != tip:
+            return False
+        try:
+            chain.check_branch(height, [block for block, _ in blocks])
+        except ValueError:
+            return False
+        # reorg: roll back to the fork point, then apply the peer's suffix
+        chain.truncate(height)
+        for block, payload in blocks:
+            chain.append(block, payload)
+        tip = chain.hash_at(-1)
+        height += len(blocks)
+        if len(headers) < MAX_HEADERS:
+            return True
+        locator = [tip]
+
+
+def restore_branch(chain, start, head):
+    # puts back the blocks head had from start up, read from the records
+    # truncate() left in the block file
+    chain.truncate(start)
+    for height in range(start, head.length):
+        payload = chain.read_raw(height, head)
+        chain.append(decode_block(payload), payload)
+
+
+def new_session():
+    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT, keepalive_timeout=60)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=PEER_TIMEOUT))
+
+
+async def sync_chain(chain, peers, session=None, verifier=None):
+    # headers-first sync: pick the valid header chain with the most work
+    # among the peers, then download only the bodies past the common
+    # ancestor and swap that suffix in, a window at a time so memory stays
+    # flat however long the branch is. A long-running node passes its own
+    # session and verifier to keep connections and worker processes alive
+    # between rounds
+    if session is None:
+        async with new_session() as session:
+            return await sync_chain(chain, peers, session, verifier)
+    if verifier is None:
+        verifier = Verifier()
+        try:
+            return await sync_chain(chain, peers, session, verifier)
+        finally:
+            verifier.close()
+    limit = asyncio.Semaphore(MAX_CONCURRENT)
+    head = chain.head
+    locator = block_locator(chain)
+    results = await poll_peers(session, limit, verifier, peers, chain, locator)
+    best = None
+    for node_url, result in zip(peers, results):
+        if result is not None and result[1] > (best[0] if best else head.tip_work):
+            best = (result[1], node_url, result[0])
+    # a block may have been mined while we were waiting on the peers
+    if best is None or chain.head.version != head.version:
+        return False
+    _, node_url, start = best
+    try:
+        applied = await apply_branch(session, limit, verifier, chain, node_url, start, locator)
+    except PEER_ERRORS:
+        applied = False
+    # a peer that failed part way, or sent less than its headers claimed,
+    # may have left us on a lighter branch: ours comes back
+    if chain.head.version != head.version and chain.tip_work <= head.tip_work:
+        restore_branch(chain, start, head)
+        return False
+    return applied
@@ -0,0 +1,96 @@
+import datetime as date
+
+import pytest
+
+from balances import BalanceIndex
+from block_store import BlockStore
+from snake_coin import Block
+
+
+def reward(address, amount=1):
+    return {'from': 'network', 'to': address, 'amount': amount}
+
+
+def pay(sender, receiver, amount, fee=0):
+    return {'from': sender, 'to': receiver, 'amount': amount, 'fee': fee}
+
+
+def next_block(chain, *transactions, previous=None):
+    previous = previous or chain[-1]
+    return Block(previous.index + 1, date.datetime(2018, 1, 1) + date.timedelta(seconds=previous.index + 1),
+                 {'transactions': list(transactions)}, previous.hash)
+
+
+def mine(chain, address, blocks):
+    # coins only come from block rewards, one per block without fees
+    for _ in range(blocks):
+        chain.append(next_block(chain, reward(address)))
+
+
+@pytest.fixture
+def chain(tmp_path):
+    chain = BlockStore(str(tmp_path / 'chain.dat'))
+    chain.append(Block(0, date.datetime(2018, 1, 1), 'GenesisBlock', '0'))
+    yield chain
+    chain.close()
+
+
+def test_balances_follow_blocks(chain):
+    balances = BalanceIndex(chain)
+    mine(chain, 'alice', 5)
+    chain.append(next_block(chain, pay('alice', 'bob', 2, fee=1), reward('miner', 2)))
+    assert (balances.balance('alice'), balances.balance('bob'), balances.balance('miner')) == (2, 2, 2)
+    chain.truncate(6)
+    assert (balances.balance('alice'), balances.balance('bob'), balances.balance('miner')) == (5, 0, 0)
+
+
+def test_overdrawing_block_is_refused(chain):
+    balances = BalanceIndex(chain)
+    mine(chain, 'alice', 2)
+    with pytest.raises(ValueError):
+        chain.append(next_block(chain, pay('alice', 'bob', 2), pay('alice', 'bob', 1)))
+    with pytest.raises(ValueError):
+        chain.append(next_block(chain, pay('alice', 'bob', 2, fee=1)))
+    assert len(chain) == 3
+    assert balances.balance('alice') == 2 and balances.balance('bob') == 0
+
+
+def test_coinbase_pays_at_most_the_reward_and_fees(chain):
+    balances = BalanceIndex(chain)
+    mine(chain, 'alice', 2)
+    for transactions in ([reward('mallory', 10 ** 12)],
+                         [reward('mallory', 2)],
+                         [pay('alice', 'bob', 1, fee=1), reward('mallory', 3)],
+                         [reward('mallory'), reward('mallory')]):
+        with pytest.raises(ValueError):
+            chain.append(next_block(chain, *transactions))
+    assert len(chain) == 3 and balances.balance('mallory') == 0
+    chain.append(next_block(chain, pay('alice', 'bob', 1, fee=1), reward('miner', 2)))
+    assert balances.balance('miner') == 2
+
+
+def test_coins_received_earlier_in_the_block_can_be_spent(chain):
+    balances = BalanceIndex(chain)
+    chain.append(next_block(chain, reward('alice'), pay('alice', 'bob', 1), pay('bob', 'carol', 1)))
+    assert balances.balance('carol') == 1
+
+
+def test_branch_is_checked_against_the_fork_point(chain):
+    balances = BalanceIndex(chain)
+    fork = chain[-1]
+    mine(chain, 'alice', 1)
+    # alice only has coins on the current branch
+    with pytest.raises(ValueError):
+        balances.check_branch(1, [next_block(chain, pay('alice', 'bob', 1), previous=fork)])
+    branch = next_block(chain, reward('bob'), previous=fork)
+    chain.check_branch(1, [branch, next_block(chain, pay('bob', 'carol', 1), previous=branch)])
+
+
+def test_snapshot_is_reloaded_and_replayed(chain):
+    balances = BalanceIndex(chain, snapshot_every=2)
+    mine(chain, 'alice', 2)
+    chain.append(next_block(chain, pay('alice', 'bob', 1)))
+    mine(chain, 'alice', 1)
+    reloaded = BalanceIndex(chain)
+    assert reloaded.balances == balances.balances == {'alice': 2, 'bob': 1}
+    assert reloaded.height == 5
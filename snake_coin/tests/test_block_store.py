@@ -0,0 +1,152 @@
+import datetime as date
+import os
+
+import pytest
+
+import block_store
+from block_store import INDEX_ENTRY, BlockStore
+from snake_coin import Block
+
+
+def make_chain(previous, count, label):
+    blocks = []
+    for _ in range(count):
+        index = previous.index + 1 if previous else 0
+        previous = Block(index, date.datetime(2018, 1, 1) + date.timedelta(seconds=index),
+                         '{}{}'.format(label, index), previous.hash if previous else '0')
+        blocks.append(previous)
+    return blocks
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'chain.dat')
+
+
+def hashes(chain):
+    return [block.hash for block in chain]
+
+
+def test_blocks_survive_a_reopen(path):
+    blocks = make_chain(None, 20, 'Block')
+    chain = BlockStore(path, sync_every=4)
+    for block in blocks:
+        chain.append(block)
+    chain.close()
+    chain = BlockStore(path)
+    assert hashes(chain) == [block.hash for block in blocks]
+    assert chain.height_of(blocks[7].hash) == 7
+    assert chain.tip_work == sum(chain.work_at(height) - (chain.work_at(height - 1) if height else 0)
+                                 for height in range(len(chain)))
+    chain.close()
+
+
+def test_torn_tail_is_dropped(path):
+    blocks = make_chain(None, 5, 'Block')
+    chain = BlockStore(path)
+    for block in blocks:
+        chain.append(block)
+    chain.close()
+    with open(path, 'ab') as data:
+        data.write(b'\x00\x00\x01\x00partial')
+    size = os.path.getsize(path)
+    chain = BlockStore(path)
+    assert len(chain) == 5
+    assert os.path.getsize(path) < size
+    chain.append(make_chain(blocks[-1], 1, 'Block')[0])
+    chain.close()
+    assert len(BlockStore(path)) == 6
+
+
+def test_lost_index_entries_are_rebuilt(path):
+    blocks = make_chain(None, 10, 'Block')
+    chain = BlockStore(path)
+    for block in blocks:
+        chain.append(block)
+    chain.close()
+    os.truncate(path + '.idx', 3 * INDEX_ENTRY.size)
+    chain = BlockStore(path)
+    assert hashes(chain) == [block.hash for block in blocks]
+    chain.close()
+
+
+def test_index_past_the_data_is_dropped(path):
+    blocks = make_chain(None, 10, 'Block')
+    chain = BlockStore(path)
+    for block in blocks:
+        chain.append(block)
+    offset = chain.head.offsets[6]
+    chain.close()
+    os.truncate(path, offset + 4)
+    chain = BlockStore(path)
+    assert hashes(chain) == [block.hash for block in blocks[:6]]
+    chain.close()
+
+
+def test_readers_keep_their_head_across_a_reorg(path):
+    blocks = make_chain(None, 10, 'Block')
+    chain = BlockStore(path)
+    for block in blocks:
+        chain.append(block)
+    head = chain.head
+    chain.truncate(5)
+    for block in make_chain(blocks[4], 3, 'Fork'):
+        chain.append(block)
+    assert [chain.get(height, head).hash for height in range(head.length)] == [block.hash for block in blocks]
+    assert bytes(list(chain.iter_raw(9, 10, head))[0]) == chain.read_raw(9, head)
+    assert len(chain) == 8 and chain.height_of(blocks[7].hash) is None
+    chain.close()
+
+
+def test_old_hashes_are_found_in_the_index(path, monkeypatch):
+    # three hashes in memory, the rest read two index entries at a time
+    monkeypatch.setattr(block_store, 'HASH_SCAN_ENTRIES', 2)
+    blocks = make_chain(None, 10, 'Block')
+    chain = BlockStore(path, recent_hashes=3)
+    for block in blocks:
+        chain.append(block)
+    assert len(chain._heights) == 3
+    assert [chain.height_of(block.hash) for block in blocks] == list(range(10))
+    assert chain.get_by_hash(blocks[1].hash).hash == blocks[1].hash
+    chain.truncate(8)
+    fork = make_chain(blocks[7], 2, 'Fork')
+    for block in fork:
+        chain.append(block)
+    assert chain.height_of(blocks[8].hash) is None and chain.height_of(fork[1].hash) == 9
+    chain.truncate(2)
+    assert chain.height_of(blocks[1].hash) == 1 and chain.height_of(blocks[5].hash) is None
+    chain.close()
+    chain = BlockStore(path, recent_hashes=1)
+    assert [chain.height_of(block.hash) for block in blocks[:2]] == [0, 1]
+    assert chain.height_of('00' * 32) is None
+    chain.close()
+
+
+@pytest.mark.parametrize('index_entries', ['old', 'cut', 'cut_and_new'])
+def test_reorg_survives_a_crash(path, index_entries):
+    # the data file is always synced before the index, so a crash can leave
+    # the index as it was before the reorg, cut at the fork point, or partly
+    # rewritten with the new branch
+    blocks = make_chain(None, 10, 'Block')
+    chain = BlockStore(path)
+    for block in blocks:
+        chain.append(block)
+    chain.sync()
+    with open(path + '.idx', 'rb') as index:
+        old_index = index.read()
+    chain.truncate(5)
+    fork = make_chain(blocks[4], 3, 'Fork')
+    for block in fork:
+        chain.append(block)
+    chain.close()
+    if index_entries == 'old':
+        with open(path + '.idx', 'wb') as index:
+            index.write(old_index)
+    elif index_entries == 'cut':
+        os.truncate(path + '.idx', 5 * INDEX_ENTRY.size)
+    else:
+        os.truncate(path + '.idx', 6 * INDEX_ENTRY.size)
+    chain = BlockStore(path)
+    assert hashes(chain) == [block.hash for block in blocks[:5] + fork]
+    assert chain.tip_work == chain.work_at(-1)
+    chain.close()
@@ -0,0 +1,65 @@
+import datetime as date
+import io
+
+import pytest
+
+from encoding import encode_transaction, encode_varint, read_transaction, read_varint
+from snake_coin import Block, decode_block, encode_block, iter_blocks, parse_header, read_block, write_block
+
+
+@pytest.mark.parametrize('value', [0, 1, 127, 128, 255, 300, 16383, 16384, 2 ** 32, 2 ** 64 + 5])
+def test_varint_round_trip(value):
+    raw = encode_varint(value)
+    stream = io.BytesIO(raw + b'rest')
+    assert read_varint(stream) == value
+    assert stream.read() == b'rest'
+    assert len(raw) == max(1, (value.bit_length() + 6) // 7)
+
+
+def test_varint_rejects_negatives_and_truncation():
+    with pytest.raises(ValueError):
+        encode_varint(-1)
+    with pytest.raises(EOFError):
+        read_varint(io.BytesIO(encode_varint(300)[:1]))
+
+
+def test_transaction_round_trip():
+    transaction = {'from': 'alice', 'to': 'böb', 'amount': 10 ** 12, 'fee': 3, 'nonce': 9}
+    assert read_transaction(io.BytesIO(encode_transaction(transaction))) == transaction
+    # missing fee and nonce encode as 0
+    assert encode_transaction({'from': 'a', 'to': 'b', 'amount': 1}) == \
+        encode_transaction({'from': 'a', 'to': 'b', 'amount': 1, 'fee': 0, 'nonce': 0})
+
+
+def test_blocks_round_trip():
+    text = Block(0, date.datetime(2018, 1, 1, 12, 30, 15, 250), 'GenesisBlock', '00' * 32)
+    transactions = Block(1, date.datetime(2018, 1, 2), {'transactions': [
+        {'from': 'alice', 'to': 'bob', 'amount': 5, 'fee': 1, 'nonce': 0},
+        {'from': 'network', 'to': 'miner', 'amount': 2, 'fee': 0, 'nonce': 0}
+    ]}, text.hash, nonce=77, bits=3)
+    for block in (text, transactions):
+        decoded = decode_block(encode_block(block))
+        assert (decoded.index, decoded.timestamp, decoded.data, decoded.previous_hash, decoded.nonce,
+                decoded.bits, decoded.hash) == (block.index, block.timestamp, block.data,
+                                                block.previous_hash, block.nonce, block.bits, block.hash)
+        assert parse_header(block.header()).hash == block.hash
+    stream = io.BytesIO(encode_block(text) + encode_block(transactions))
+    assert [block.hash for block in iter_blocks(stream)] == [text.hash, transactions.hash]
+    stream = io.BytesIO()
+    write_block(stream, text)
+    write_block(stream, transactions)
+    assert stream.getvalue() == encode_block(text) + encode_block(transactions)
+    stream.seek(0)
+    assert read_block(stream).hash == text.hash and read_block(stream).hash == transactions.hash
+    assert read_block(stream) is None
+
+
+def test_tampered_block_is_refused():
+    block = Block(1, date.datetime(2018, 1, 2), {'transactions': [{'from': 'a', 'to': 'b', 'amount': 5}]}, '0')
+    payload = encode_block(block)
+    # the amount is the third varint from the end of the body
+    tampered = payload[:-3] + bytes([payload[-3] + 1]) + payload[-2:]
+    with pytest.raises(ValueError):
+        decode_block(tampered)
+    with pytest.raises(EOFError):
+        decode_block(payload[:-1])
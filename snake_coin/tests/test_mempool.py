@@ -0,0 +1,93 @@
+import datetime as date
+
+import pytest
+
+from block_store import BlockStore
+from encoding import encode_transaction
+from mempool import Mempool, check_transaction, transaction_id
+from snake_coin import Block
+
+
+def pay(sender, amount=1, fee=0, nonce=0, receiver='bob'):
+    return {'from': sender, 'to': receiver, 'amount': amount, 'fee': fee, 'nonce': nonce}
+
+
+def test_select_takes_the_highest_fees_first():
+    mempool = Mempool()
+    for nonce, fee in enumerate([1, 5, 0, 5, 3]):
+        mempool.add(pay('alice', fee=fee, nonce=nonce))
+    # equal fees keep their arrival order
+    assert [(tx['fee'], tx['nonce']) for tx in mempool.select()] == [(5, 1), (5, 3), (3, 4), (1, 0), (0, 2)]
+
+
+def test_duplicates_and_bad_transactions_are_refused():
+    mempool = Mempool()
+    mempool.add(pay('alice'))
+    with pytest.raises(ValueError):
+        mempool.add(pay('alice'))
+    for bad in [pay('alice', amount=-1), pay('alice', fee=True), dict(pay('alice'), memo='x'),
+                {'from': 'alice', 'amount': 1}, [pay('alice')]]:
+        with pytest.raises(ValueError):
+            check_transaction(bad)
+
+
+def test_full_pool_evicts_the_lowest_fee():
+    mempool = Mempool(max_transactions=3)
+    ids = [mempool.add(pay('alice', fee=fee, nonce=fee)) for fee in (2, 1, 3)]
+    with pytest.raises(ValueError):
+        mempool.add(pay('carol', fee=1))
+    mempool.add(pay('carol', fee=4))
+    assert len(mempool) == 3 and ids[1] not in mempool
+    assert mempool.pending('alice') == 1 + 2 + 1 + 3
+
+
+def test_pending_follows_removals():
+    mempool = Mempool()
+    first = mempool.add(pay('alice', amount=5, fee=1))
+    mempool.add(pay('alice', amount=2, nonce=1))
+    assert mempool.pending('alice') == 8 and len(mempool.by_sender('alice')) == 2
+    mempool.remove(first)
+    assert mempool.pending('alice') == 2
+    mempool.remove_transactions(mempool.by_sender('alice'))
+    assert mempool.pending('alice') == 0 and not mempool.by_sender('alice')
+
+
+def test_select_fits_the_byte_limit():
+    mempool = Mempool()
+    small = pay('a', fee=1)
+    large = pay('a' * 100, fee=2)
+    mempool.add(small)
+    mempool.add(large)
+    size = len(encode_transaction(small))
+    # the better paying transaction doesn't fit, the smaller one still does
+    assert mempool.select(max_bytes=size) == [small]
+    assert mempool.select(max_bytes=size + len(encode_transaction(large))) == [large, small]
+
+
+def test_select_leaves_out_what_senders_can_no_longer_pay():
+    mempool = Mempool()
+    for nonce in range(3):
+        mempool.add(pay('alice', amount=2, fee=1, nonce=nonce))
+    mempool.add(pay('carol', amount=1))
+    funds = {'alice': 6, 'carol': 0}
+    selected = mempool.select(can_spend=lambda sender, amount: amount <= funds[sender])
+    assert [tx['from'] for tx in selected] == ['alice', 'alice']
+
+
+def test_pool_follows_connected_and_disconnected_blocks(tmp_path):
+    chain = BlockStore(str(tmp_path / 'chain.dat'))
+    genesis = Block(0, date.datetime(2018, 1, 1), 'GenesisBlock', '0')
+    chain.append(genesis)
+    mempool = Mempool()
+    chain.add_listener(mempool)
+    waiting = pay('alice', fee=1)
+    confirmed = pay('carol')
+    mempool.add(waiting)
+    mempool.add(confirmed)
+    coinbase = {'from': 'network', 'to': 'miner', 'amount': 1}
+    chain.append(Block(1, date.datetime(2018, 1, 2), {'transactions': [confirmed, coinbase]}, genesis.hash))
+    assert list(mempool.select()) == [waiting]
+    chain.truncate(1)
+    assert transaction_id(confirmed) in mempool and transaction_id(coinbase) not in mempool
+    assert len(mempool) == 2
+    chain.close()
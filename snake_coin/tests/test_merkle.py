@@ -0,0 +1,45 @@
+import datetime as date
+
+import pytest
+
+import merkle
+from snake_coin import Block
+
+
+def transactions(count):
+    return [{'from': 'sender{}'.format(i), 'to': 'receiver', 'amount': i + 1} for i in range(count)]
+
+
+@pytest.mark.parametrize('count', [1, 2, 3, 5, 8, 13])
+def test_every_transaction_has_a_proof(count):
+    block = Block(1, date.datetime(2018, 1, 1), {'transactions': transactions(count)}, '0')
+    for index, transaction in enumerate(block.transactions):
+        proof = block.merkle_proof(index)
+        assert len(proof) <= (count - 1).bit_length()
+        assert merkle.verify_transaction(transaction, proof, block.merkle_root)
+        other = dict(transaction, amount=transaction['amount'] + 1)
+        assert not merkle.verify_transaction(other, proof, block.merkle_root)
+
+
+def test_root_commits_to_order_and_content():
+    leaves = [merkle.hash_transaction(transaction) for transaction in transactions(4)]
+    root = merkle.merkle_root(leaves)
+    assert merkle.merkle_root(leaves[::-1]) != root
+    assert merkle.merkle_root(leaves[:3]) != root
+    # an odd leaf is carried up, not paired with itself
+    assert merkle.merkle_root(leaves[:3]) != merkle.merkle_root(leaves[:3] + leaves[2:3])
+
+
+def test_inner_node_is_not_a_leaf():
+    leaves = [merkle.hash_transaction(transaction) for transaction in transactions(4)]
+    levels = merkle.merkle_levels(leaves)
+    # the first inner node, presented as a leaf with the rest of its path
+    proof = merkle.merkle_proof(levels[1:], 0)
+    assert merkle.verify_proof(levels[1][0], proof, levels[-1][0])
+    assert not merkle.verify_proof(merkle.hash_leaf(leaves[0] + leaves[1]), proof, levels[-1][0])
+
+
+def test_header_changes_with_the_transactions():
+    block = Block(1, date.datetime(2018, 1, 1), {'transactions': transactions(3)}, '0')
+    changed = Block(1, date.datetime(2018, 1, 1), {'transactions': transactions(3)[:2]}, '0')
+    assert block.hash != changed.hash
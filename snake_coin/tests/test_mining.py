@@ -0,0 +1,65 @@
+import datetime as date
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+import mining
+from snake_coin import Block, hash_meets_target
+
+
+def make_block(index=1):
+    return Block(index, date.datetime(2018, 1, 1), {'transactions': [{'from': 'a', 'to': 'b', 'amount': 1}]}, '0')
+
+
+def test_midstate_search_hashes_like_the_block():
+    block = make_block()
+    nonce, digest, hashes = mining.search_nonces(block.header_prefix(), 8, 0, 1)
+    # every nonce below the hit was tried and missed
+    assert hashes == nonce + 1
+    block.nonce = nonce
+    assert block.hash_block() == digest
+    assert hash_meets_target(digest, 8)
+    for missed in range(nonce):
+        block.nonce = missed
+        assert not hash_meets_target(block.hash_block(), 8)
+
+
+def test_search_stops_at_the_limit():
+    nonce, digest, hashes = mining.search_nonces(make_block().header_prefix(), 256, 0, 1, limit=10)
+    assert (nonce, digest) == (None, None)
+    assert hashes == mining.BATCH_SIZE
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_mined_block_has_a_valid_proof(workers):
+    block = make_block()
+    result = mining.mine_block(block, 12, workers)
+    assert block.nonce == result.nonce and block.hash == result.hash
+    assert block.bits == 12 and block.has_valid_proof()
+
+
+def test_first_hit_stops_the_other_workers():
+    # every worker stops within a batch of the hit, and a found block
+    # doesn't cancel the next search
+    for index in range(2):
+        result = mining.mine(make_block(index).header_prefix(), 14, workers=3)
+        assert result.nonce is not None and hash_meets_target(result.hash, 14)
+        assert result.hashes <= result.nonce + 3 * (mining.BATCH_SIZE + 1)
+    assert not multiprocessing.active_children()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_stop_event_abandons_the_search(workers):
+    block = make_block()
+    stop = multiprocessing.Event()
+    timer = threading.Timer(0.2, stop.set)
+    timer.start()
+    started = time.perf_counter()
+    result = mining.mine_block(block, 256, workers, stop)
+    assert time.perf_counter() - started < 5
+    assert result.nonce is None and result.hashes > 0
+    # no nonce was set
+    assert block.nonce == 0 and not block.has_valid_proof()
+    timer.join()
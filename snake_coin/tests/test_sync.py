@@ -0,0 +1,390 @@
+import asyncio
+import datetime as date
+import importlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import mining
+import sync
+from block_store import BlockStore
+from ingest import Verifier
+from snake_coin import HEADER_SIZE, Block, block_work, encode_block, parse_header
+from sync import block_locator, branch_work, locate, validate_headers
+
+NODE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'snake_server.py')
+MINER = 'q3nf394hjg-random-miner-address-34nf3i4nflkn3oi'
+WAIT = 20
+
+
+def extend(chain, count, label, bits=2):
+    # mines count blocks on top of chain, returns them
+    blocks = []
+    for _ in range(count):
+        previous = chain[-1] if len(chain) else None
+        index = previous.index + 1 if previous else 0
+        block = Block(index, date.datetime(2018, 1, 1) + date.timedelta(seconds=index),
+                      '{}{}'.format(label, index), previous.hash if previous else '00' * 32)
+        mining.mine_block(block, bits, workers=1)
+        chain.append(block)
+        blocks.append(block)
+    return blocks
+
+
+@pytest.fixture
+def chains(tmp_path):
+    opened = []
+
+    def open_chain(name):
+        opened.append(BlockStore(str(tmp_path / name)))
+        return opened[-1]
+
+    yield open_chain
+    for chain in opened:
+        chain.close()
+
+
+def test_locator_is_dense_near_the_tip(chains):
+    chain = chains('chain.dat')
+    extend(chain, 40, 'Block', bits=0)
+    locator = block_locator(chain)
+    assert locator[:10] == [chain.hash_at(height) for height in range(39, 29, -1)]
+    assert locator[-1] == chain.hash_at(0)
+    assert len(locator) <= 10 + (40).bit_length() + 1
+
+
+def test_locate_finds_the_fork_point(chains):
+    ours = chains('ours.dat')
+    theirs = chains('theirs.dat')
+    for block in extend(ours, 20, 'Block', bits=0):
+        theirs.append(block)
+    extend(ours, 15, 'Ours', bits=0)
+    extend(theirs, 3, 'Theirs', bits=0)
+    assert locate(theirs, block_locator(ours)) == 20
+    assert locate(ours, block_locator(theirs)) == 20
+    assert locate(theirs, ['00' * 32]) == 0
+
+
+def test_headers_are_checked_past_the_fork(chains):
+    ours = chains('ours.dat')
+    theirs = chains('theirs.dat')
+    for block in extend(ours, 5, 'Block'):
+        theirs.append(block)
+    headers = [parse_header(block.header()) for block in extend(theirs, 4, 'Theirs')]
+    assert validate_headers(ours, 5, headers)
+    assert branch_work(ours, 5, headers) == ours.tip_work + 4 * block_work(2)
+    # not linked to our block at the fork, skipping a height, past our tip
+    assert not validate_headers(ours, 4, headers)
+    assert not validate_headers(ours, 5, headers[:1] + headers[2:])
+    assert not validate_headers(ours, 7, headers)
+
+
+def test_verifier_checks_proof_of_work(chains):
+    chain = chains('chain.dat')
+    blocks = extend(chain, 3, 'Block', bits=4)
+    verifier = Verifier(1)
+    raw = b''.join(block.header() for block in blocks)
+    assert [header.hash for header in asyncio.run(verifier.headers(raw))] == [block.hash for block in blocks]
+    weak = Block(3, date.datetime(2018, 1, 2), 'Weak', blocks[-1].hash, bits=32)
+    with pytest.raises(ValueError):
+        asyncio.run(verifier.headers(raw + weak.header()))
+    payloads = [encode_block(block) for block in blocks]
+    decoded = asyncio.run(verifier.blocks(b''.join(payloads)))
+    assert [(block.hash, payload) for block, payload in decoded] == \
+        [(block.hash, payload) for block, payload in zip(blocks, payloads)]
+    verifier.close()
+
+
+def peer_app(chain, broken_from=None):
+    # a stand-in peer serving chain the way a node does, whose /blocks
+    # fails for heights from broken_from up
+    async def headers(request):
+        locator = [block_hash for block_hash in request.query['locator'].split(',') if block_hash]
+        start = locate(chain, locator)
+        raw = [bytes(payload[:HEADER_SIZE]) for payload in chain.iter_raw(start, start + int(request.query['limit']))]
+        return web.Response(body=sync.HEADERS_START.pack(start) + b''.join(raw))
+
+    async def blocks(request):
+        start, stop = int(request.query['from']), int(request.query['to'])
+        if broken_from is not None and stop > broken_from:
+            raise web.HTTPInternalServerError()
+        return web.Response(body=b''.join(bytes(payload) for payload in chain.iter_raw(start, stop)))
+
+    app = web.Application()
+    app.router.add_get('/headers', headers)
+    app.router.add_get('/blocks', blocks)
+    return app
+
+
+def sync_with(chain, apps, urls=()):
+    # serves apps on local ports and syncs chain with them and urls
+    async def run():
+        servers = [TestServer(app) for app in apps]
+        verifier = Verifier(1)
+        try:
+            for server in servers:
+                await server.start_server()
+            peers = [str(server.make_url('')).rstrip('/') for server in servers] + list(urls)
+            return await sync.sync_chain(chain, peers, verifier=verifier)
+        finally:
+            verifier.close()
+            for server in servers:
+                await server.close()
+    return asyncio.run(run())
+
+
+def share(source, target, count):
+    for height in range(count):
+        target.append(source[height])
+
+
+def test_long_branch_is_applied_in_windows(chains, monkeypatch):
+    ours = chains('ours.dat')
+    theirs = chains('theirs.dat')
+    extend(ours, 2, 'Block')
+    share(ours, theirs, 2)
+    extend(theirs, 10, 'Theirs')
+    extend(ours, 2, 'Ours')
+    monkeypatch.setattr(sync, 'MAX_HEADERS', 3)
+    monkeypatch.setattr(sync, 'BODY_BATCH', 2)
+    windows = []
+    check_branch = ours.check_branch
+    monkeypatch.setattr(ours, 'check_branch', lambda start, blocks: windows.append(len(blocks)) or
+                        check_branch(start, blocks))
+    assert sync_with(ours, [peer_app(theirs)])
+    assert [block.hash for block in ours] == [block.hash for block in theirs]
+    # one window checked and appended at a time: 3 + 3 + 3 + 1, each
+    # append re-checking its single block
+    assert [size for size in windows if size > 1] == [3, 3, 3]
+
+
+def test_branch_failing_part_way_is_rolled_back(chains, monkeypatch):
+    ours = chains('ours.dat')
+    theirs = chains('theirs.dat')
+    extend(ours, 2, 'Block')
+    share(ours, theirs, 2)
+    extend(theirs, 8, 'Theirs')
+    extend(ours, 5, 'Ours')
+    before = [block.hash for block in ours]
+    monkeypatch.setattr(sync, 'MAX_HEADERS', 3)
+    cuts = []
+    truncate = ours.truncate
+    monkeypatch.setattr(ours, 'truncate', lambda height: cuts.append(height) or truncate(height))
+    # the first window (heights 2-4) applies, the second can't be fetched
+    assert not sync_with(ours, [peer_app(theirs, broken_from=6)])
+    assert cuts == [2, 2]
+    assert [block.hash for block in ours] == before
+    assert ours.tip_work == ours.work_at(-1)
+
+
+def free_port():
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        return listener.getsockname()[1]
+
+
+def request(url, data=None):
+    body = None if data is None else json.dumps(data).encode()
+    with urllib.request.urlopen(urllib.request.Request(url, body), timeout=WAIT) as response:
+        return response.read()
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + WAIT
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.05)
+
+
+class Node:
+    def __init__(self, directory, name, peers=()):
+        self.url = 'http://127.0.0.1:{}'.format(free_port())
+        arguments = [sys.executable, NODE, '--port', self.url.rsplit(':', 1)[1], '--bits', '1',
+                     '--workers', '1', '--verify-workers', '1', '--sync-interval', '0.1']
+        for peer in peers:
+            arguments += ['--peer', peer.url]
+        environment = dict(os.environ, SNAKE_COIN_CHAIN=os.path.join(str(directory), name + '.dat'))
+        self.process = subprocess.Popen(arguments, env=environment, cwd=str(directory),
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wait_for(self.is_up)
+
+    def is_up(self):
+        try:
+            self.blocks()
+            return True
+        except (urllib.error.URLError, OSError):
+            return False
+
+    def blocks(self):
+        return request(self.url + '/blocks')
+
+    def mine(self):
+        return json.loads(request(self.url + '/mine'))
+
+    def send(self, transaction):
+        return request(self.url + '/txion', transaction)
+
+    def balance(self, address):
+        return json.loads(request(self.url + '/balance/' + address))
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(WAIT)
+
+
+@pytest.fixture
+def nodes(tmp_path):
+    started = []
+
+    def start(name, peers=()):
+        started.append(Node(tmp_path, name, peers))
+        return started[-1]
+
+    yield start
+    for node in started:
+        node.stop()
+
+
+def test_synced_and_reorged_blocks_update_the_mempool(nodes):
+    a = nodes('a')
+    a.mine()
+    b = nodes('b', [a])
+    wait_for(lambda: b.blocks() == a.blocks())
+
+    # b confirms the transaction on a branch of its own...
+    transaction = {'from': MINER, 'to': 'bob', 'amount': 1}
+    b.send(transaction)
+    assert b.mine()['data']['transactions'][0] == transaction
+    assert b.balance('bob')['balance'] == 1
+    assert b.balance(MINER)['pending'] == 0
+
+    # ...which a's heavier branch replaces, so it waits in b's pool again
+    a.mine()
+    a.mine()
+    wait_for(lambda: b.blocks() == a.blocks())
+    assert b.balance('bob')['balance'] == 0
+    assert b.balance(MINER)['pending'] == 1
+
+    # once a synced block confirms it, b doesn't mine it a second time
+    a.send(transaction)
+    a.mine()
+    wait_for(lambda: b.blocks() == a.blocks())
+    assert b.balance(MINER)['pending'] == 0
+    assert b.mine()['data']['transactions'] == [{'from': 'network', 'to': MINER, 'amount': 1}]
+    assert b.balance('bob')['balance'] == 1
+
+
+def test_round_is_not_held_up_by_dead_peers(chains, nodes, tmp_path, monkeypatch):
+    # a peer that never answers and one that isn't listening cost one
+    # PEER_TIMEOUT, polled alongside a real node whose chain is adopted
+    theirs = BlockStore(str(tmp_path / 'real.dat'))
+    extend(theirs, 4, 'Theirs')
+    expected = [block.hash for block in theirs]
+    theirs.close()
+    real = nodes('real')
+    ours = chains('ours.dat')
+    extend(ours, 1, 'Ours')
+    monkeypatch.setattr(sync, 'PEER_TIMEOUT', 0.5)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def hang(request):
+            await release.wait()
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_get('/headers', hang)
+        server = TestServer(app)
+        await server.start_server()
+        verifier = Verifier(1)
+        peers = [str(server.make_url('')).rstrip('/'), 'http://127.0.0.1:{}'.format(free_port()), real.url]
+        try:
+            started = time.perf_counter()
+            synced = await sync.sync_chain(ours, peers, verifier=verifier)
+            return synced, time.perf_counter() - started
+        finally:
+            release.set()
+            verifier.close()
+            await server.close()
+
+    synced, elapsed = asyncio.run(run())
+    assert synced
+    assert [block.hash for block in ours] == expected
+    assert 0.5 <= elapsed < 1.5
+
+
+def test_fork_choice_goes_by_work_not_length(chains):
+    ours = chains('ours.dat')
+    heavy = chains('heavy.dat')
+    light = chains('light.dat')
+    extend(ours, 1, 'Genesis')
+    share(ours, heavy, 1)
+    share(ours, light, 1)
+    extend(heavy, 3, 'Heavy', bits=6)
+    extend(light, 8, 'Light', bits=2)
+    assert len(light) > len(heavy) and light.tip_work < heavy.tip_work
+    assert sync_with(ours, [peer_app(light), peer_app(heavy)])
+    assert [block.hash for block in ours] == [block.hash for block in heavy]
+    # a longer, lighter branch doesn't replace it
+    assert not sync_with(ours, [peer_app(light)])
+    assert len(ours) == 4
+
+
+def test_shorter_heavier_branch_replaces_ours(chains):
+    ours = chains('ours.dat')
+    heavy = chains('heavy.dat')
+    extend(ours, 2, 'Block')
+    share(ours, heavy, 2)
+    extend(ours, 6, 'Ours', bits=2)
+    extend(heavy, 2, 'Heavy', bits=6)
+    assert sync_with(ours, [peer_app(heavy)])
+    assert [block.hash for block in ours] == [block.hash for block in heavy]
+
+
+def test_failed_sync_rounds_do_not_stop_the_loop(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('SNAKE_COIN_CHAIN', str(tmp_path / 'server.dat'))
+    server = importlib.import_module('snake_server')
+    monkeypatch.setattr(server, 'sync_interval', 0)
+    monkeypatch.setattr(server, 'peer_nodes', ['http://127.0.0.1:1'])
+    failures = [OSError('connection reset'), BrokenProcessPool('worker died'), ValueError('bad block')]
+    rounds = []
+    closed = []
+    verifier = Verifier(1)
+    monkeypatch.setattr(verifier, 'close', lambda: closed.append(True))
+
+    async def run():
+        done = asyncio.Event()
+
+        async def consensus(session, verifier):
+            rounds.append(verifier)
+            if failures:
+                raise failures.pop(0)
+            done.set()
+
+        monkeypatch.setattr(server, 'consensus', consensus)
+        task = asyncio.create_task(server.sync_forever({'session': None, 'verifier': verifier}))
+        await asyncio.wait_for(done.wait(), WAIT)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    # the loop went on after each failure
+    assert len(rounds) > 3
+    # only a broken pool is thrown away
+    assert closed == [True]
+    errors = capsys.readouterr().err
+    assert 'connection reset' in errors and 'worker died' in errors and 'bad block' in errors
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Headless AI tournaments.
+
+    Plays N seeded games of the headless Game2048 core with the AI
+    across a process pool and aggregates the results, e.g. to tune the
+    AI.ai_move weights or the search leaf weights:
+
+        python3 simulate.py --games 1000 --policy greedy --num-weight 1.5
+        python3 simulate.py --games 8 --policy iterative --depth 6 \\
+            --max-time 0.05 --search-weight empty=20
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import time
+
+from src import bitboard as BB
+from src import game2048_core as GC
+from src import game2048_trace as GT
+from src import heuristics as HE
+from src.game2048_ai import AI
+
+POLICIES = ("greedy", "expectimax", "iterative")
+
+
+def play_game(seed, policy="greedy", depth=2, max_time=0.010,
+              trace_dir=None, **weights):
+    """
+        plays one game to the end, returns its statistics. With
+        trace_dir, the AI decisions go to trace_dir/game-<seed>.jsonl.
+    """
+    _game = GC.Game2048(seed=seed)
+    _game.new_game()
+    _trace = None
+    if trace_dir:
+        os.makedirs(trace_dir, exist_ok=True)
+        _trace = GT.TraceWriter(
+            os.path.join(trace_dir, "game-{s}.jsonl".format(s=seed))
+        )
+    # end if
+    _ai = AI(board=_game.board, trace=_trace, **weights)
+    _start = time.perf_counter()
+    while not _game.is_game_over():
+        _ai.reset(_game.board)
+        if policy == "expectimax":
+            _direction = _ai.search_move(depth, max_time)
+        elif policy == "iterative":
+            _direction = _ai.think_move(max_time, depth)
+        else:
+            _direction = _ai.ai_move()
+        # end if
+        if not _game.play(_direction):
+            # the AI picked a move that does nothing, take the first
+            # one that does instead of looping forever
+            for _direction in BB.DIRECTIONS:
+                if _game.play(_direction):
+                    break
+                # end if
+            # end for
+        # end if
+    # end while
+    if _trace is not None:
+        _trace.close()
+    # end if
+    return dict(
+        seed=seed,
+        score=_game.score,
+        max_tile=_game.max_tile,
+        moves=_game.moves,
+        seconds=time.perf_counter() - _start,
+    )
+# end def
+
+
+def _play_game(kw):
+    return play_game(**kw)
+# end def
+
+
+def summarize(results, wall_time=None):
+    _games = len(results)
+    if not _games:
+        return dict(games=0)
+    # end if
+    _scores = sorted(_r["score"] for _r in results)
+    _moves = sum(_r["moves"] for _r in results)
+    _seconds = sum(_r["seconds"] for _r in results)
+    _tiles = collections.Counter(_r["max_tile"] for _r in results)
+    _summary = dict(
+        games=_games,
+        max_tile=dict(sorted(_tiles.items())),
+        score_mean=sum(_scores) / _games,
+        score_median=_scores[_games // 2],
+        score_min=_scores[0],
+        score_max=_scores[-1],
+        moves_mean=_moves / _games,
+        moves_per_second=_moves / _seconds if _seconds else 0.0,
+    )
+    if wall_time:
+        _summary.update(
+            wall_time=wall_time,
+            total_moves_per_second=_moves / wall_time,
+        )
+    # end if
+    return _summary
+# end def
+
+
+def simulate(games=100, workers=None, seed=0, policy="greedy",
+             depth=2, max_time=0.010, trace_dir=None, **weights):
+    """
+        plays games seeded seed, seed + 1, ... on a pool of workers
+        processes (one per core by default) and returns
+        (summary, per-game results).
+    """
+    if policy not in POLICIES:
+        raise ValueError("unknown policy '{p}'.".format(p=policy))
+    # end if
+    _jobs = [
+        dict(seed=seed + _n, policy=policy, depth=depth,
+             max_time=max_time, trace_dir=trace_dir, **weights)
+        for _n in range(games)
+    ]
+    _workers = workers or os.cpu_count() or 1
+    _start = time.perf_counter()
+    if _workers == 1:
+        _results = [_play_game(_job) for _job in _jobs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(_workers) as _pool:
+            _chunk = max(1, games // (4 * _workers))
+            _results = list(_pool.map(_play_game, _jobs, chunksize=_chunk))
+        # end with
+    # end if
+    return summarize(_results, time.perf_counter() - _start), _results
+# end def
+
+
+def parse_weight(text):
+    """
+        NAME=VALUE of a --search-weight option, NAME one of
+        heuristics.WEIGHTS.
+    """
+    _name, _sep, _value = text.partition("=")
+    if not _sep or _name not in HE.WEIGHTS:
+        raise argparse.ArgumentTypeError(
+            "expected NAME=VALUE with NAME in {n}".format(n=", ".join(HE.WEIGHTS))
+        )
+    # end if
+    return _name, float(_value)
+# end def
+
+
+def main(argv=None):
+    _parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    _parser.add_argument("--games", type=int, default=100)
+    _parser.add_argument("--workers", type=int, default=None)
+    _parser.add_argument("--seed", type=int, default=0)
+    _parser.add_argument("--policy", choices=POLICIES, default="greedy")
+    _parser.add_argument("--depth", type=int, default=2,
+                         help="search depth, or max depth for --policy iterative")
+    _parser.add_argument("--max-time", type=float, default=0.010)
+    _parser.add_argument("--num-weight", type=float, default=AI.NUM_WEIGHT)
+    _parser.add_argument("--position-weight", type=float, default=AI.POSITION_WEIGHT)
+    _parser.add_argument("--search-weight", type=parse_weight, action="append", default=[],
+                         metavar="NAME=VALUE",
+                         help="overrides one of AI.SEARCH_WEIGHTS, may be repeated")
+    _parser.add_argument("--output", help="also write per-game results to this JSON file")
+    _parser.add_argument("--trace-dir", help="write a JSONL decision trace per game here")
+    _args = _parser.parse_args(argv)
+    _search_weights = dict(AI.SEARCH_WEIGHTS)
+    _search_weights.update(_args.search_weight)
+    _summary, _results = simulate(
+        games=_args.games, workers=_args.workers, seed=_args.seed,
+        policy=_args.policy, depth=_args.depth, max_time=_args.max_time,
+        num_weight=_args.num_weight, position_weight=_args.position_weight,
+        search_weights=_search_weights, trace_dir=_args.trace_dir,
+    )
+    print(json.dumps(_summary, indent=4))
+    if _args.output:
+        with open(_args.output, "w") as _file:
+            json.dump(dict(summary=_summary, games=_results), _file, indent=4)
+        # end with
+    # end if
+# end def
+
+
+if __name__ == "__main__":
+    main()
+# end if
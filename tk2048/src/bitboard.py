@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Bitboard move engine for the 2048 AI.
+
+    The 4x4 board is packed into a single 64-bit integer, one 4-bit
+    nibble per cell holding the tile exponent (0 = empty, 1 = 2,
+    2 = 4, ..., 15 = 32768). Cell (row, column) lives at nibble
+    4 * row + column, so each board row is one 16-bit word.
+
+    Moves are applied through precomputed 65536-entry tables indexed
+    by a 16-bit row (or transposed column), so a whole move costs four
+    table lookups instead of a Python walk over the cells.
+"""
+
+ROW_MASK = 0xFFFF
+COL_MASK = 0x000F000F000F000F
+
+# directions, in the same order as AI.ai_move scores them
+DOWN, RIGHT, LEFT, UP = range(4)
+DIRECTIONS = (DOWN, RIGHT, LEFT, UP)
+
+
+def _reverse_row(row):
+    return (
+        (row >> 12) | ((row >> 4) & 0x00F0) |
+        ((row << 4) & 0x0F00) | ((row << 12) & 0xF000)
+    )
+# end def
+
+
+def _unpack_col(row):
+    return (row | (row << 12) | (row << 24) | (row << 36)) & COL_MASK
+# end def
+
+
+def _slide_left(row):
+    _line = [(row >> (4 * _i)) & 0xF for _i in range(4)]
+    _tiles = [_v for _v in _line if _v]
+    _result = []
+    _score = 0
+    _i = 0
+    while _i < len(_tiles):
+        _value = _tiles[_i]
+        if (_i + 1 < len(_tiles) and _tiles[_i + 1] == _value and
+                _value != 0xF):
+            _result.append(_value + 1)
+            _score += 1 << (_value + 1)
+            _i += 2
+        else:
+            _result.append(_value)
+            _i += 1
+        # end if
+    # end while
+    _packed = 0
+    for _i, _value in enumerate(_result):
+        _packed |= _value << (4 * _i)
+    # end for
+    return _packed, _score
+# end def
+
+
+def _build_tables():
+    _left = [0] * 65536
+    _score = [0] * 65536
+    for _row in range(65536):
+        _left[_row], _score[_row] = _slide_left(_row)
+    # end for
+    _right = [0] * 65536
+    _score_right = [0] * 65536
+    _up = [0] * 65536
+    _down = [0] * 65536
+    for _row in range(65536):
+        _rev = _reverse_row(_row)
+        _right[_row] = _reverse_row(_left[_rev])
+        _score_right[_row] = _score[_rev]
+        _up[_row] = _unpack_col(_left[_row])
+        _down[_row] = _unpack_col(_right[_row])
+    # end for
+    return _left, _right, _up, _down, _score, _score_right
+# end def
+
+
+(_ROW_LEFT, _ROW_RIGHT, _COL_UP, _COL_DOWN,
+ _SCORE_LEFT, _SCORE_RIGHT) = _build_tables()
+
+
+def transpose(board):
+    _a1 = board & 0xF0F00F0FF0F00F0F
+    _a2 = board & 0x0000F0F00000F0F0
+    _a3 = board & 0x0F0F00000F0F0000
+    _a = _a1 | (_a2 << 12) | (_a3 >> 12)
+    _b1 = _a & 0xFF00FF0000FF00FF
+    _b2 = _a & 0x00FF00FF00000000
+    _b3 = _a & 0x00000000FF00FF00
+    return _b1 | (_b2 >> 24) | (_b3 << 24)
+# end def
+
+
+def flip_horizontal(board):
+    """
+        mirrors the columns: (row, column) -> (row, 3 - column).
+    """
+    _x = ((board & 0x0F0F0F0F0F0F0F0F) << 4) | ((board >> 4) & 0x0F0F0F0F0F0F0F0F)
+    return ((_x & 0x00FF00FF00FF00FF) << 8) | ((_x >> 8) & 0x00FF00FF00FF00FF)
+# end def
+
+
+def flip_vertical(board):
+    """
+        mirrors the rows: (row, column) -> (3 - row, column).
+    """
+    _x = ((board & 0x0000FFFF0000FFFF) << 16) | ((board >> 16) & 0x0000FFFF0000FFFF)
+    return ((_x & 0x00000000FFFFFFFF) << 32) | (_x >> 32)
+# end def
+
+
+# the 8 symmetries of the square are numbered 0-7: bit 2 transposes,
+# then bit 0 flips horizontally, then bit 1 flips vertically
+SYMMETRIES = range(8)
+_TRANSPOSED = {DOWN: RIGHT, RIGHT: DOWN, LEFT: UP, UP: LEFT}
+_FLIPPED_H = {DOWN: DOWN, RIGHT: LEFT, LEFT: RIGHT, UP: UP}
+_FLIPPED_V = {DOWN: UP, RIGHT: RIGHT, LEFT: LEFT, UP: DOWN}
+
+
+def transform(board, symmetry):
+    if symmetry & 4:
+        board = transpose(board)
+    # end if
+    if symmetry & 1:
+        board = flip_horizontal(board)
+    # end if
+    if symmetry & 2:
+        board = flip_vertical(board)
+    # end if
+    return board
+# end def
+
+
+def untransform(board, symmetry):
+    """
+        inverse of transform(board, symmetry).
+    """
+    if symmetry & 2:
+        board = flip_vertical(board)
+    # end if
+    if symmetry & 1:
+        board = flip_horizontal(board)
+    # end if
+    if symmetry & 4:
+        board = transpose(board)
+    # end if
+    return board
+# end def
+
+
+def canonical(board):
+    """
+        returns (representative, symmetry): the smallest of the 8
+        symmetric images of board, and the symmetry giving it, so that
+        transform(board, symmetry) == representative.
+    """
+    _t = transpose(board)
+    _best, _symmetry = board, 0
+    for _image, _s in (
+            (flip_horizontal(board), 1),
+            (flip_vertical(board), 2),
+            (flip_vertical(flip_horizontal(board)), 3),
+            (_t, 4),
+            (flip_horizontal(_t), 5),
+            (flip_vertical(_t), 6),
+            (flip_vertical(flip_horizontal(_t)), 7)):
+        if _image < _best:
+            _best, _symmetry = _image, _s
+        # end if
+    # end for
+    return _best, _symmetry
+# end def
+
+
+def transform_direction(direction, symmetry):
+    """
+        the move on transform(board, symmetry) that matches direction
+        on board.
+    """
+    if symmetry & 4:
+        direction = _TRANSPOSED[direction]
+    # end if
+    if symmetry & 1:
+        direction = _FLIPPED_H[direction]
+    # end if
+    if symmetry & 2:
+        direction = _FLIPPED_V[direction]
+    # end if
+    return direction
+# end def
+
+
+def untransform_direction(direction, symmetry):
+    """
+        maps a move found on transform(board, symmetry) back to board.
+    """
+    if symmetry & 2:
+        direction = _FLIPPED_V[direction]
+    # end if
+    if symmetry & 1:
+        direction = _FLIPPED_H[direction]
+    # end if
+    if symmetry & 4:
+        direction = _TRANSPOSED[direction]
+    # end if
+    return direction
+# end def
+
+
+def move_left(board):
+    return (
+        _ROW_LEFT[board & ROW_MASK] |
+        _ROW_LEFT[(board >> 16) & ROW_MASK] << 16 |
+        _ROW_LEFT[(board >> 32) & ROW_MASK] << 32 |
+        _ROW_LEFT[(board >> 48) & ROW_MASK] << 48
+    )
+# end def
+
+
+def move_right(board):
+    return (
+        _ROW_RIGHT[board & ROW_MASK] |
+        _ROW_RIGHT[(board >> 16) & ROW_MASK] << 16 |
+        _ROW_RIGHT[(board >> 32) & ROW_MASK] << 32 |
+        _ROW_RIGHT[(board >> 48) & ROW_MASK] << 48
+    )
+# end def
+
+
+def move_up(board):
+    _t = transpose(board)
+    return (
+        _COL_UP[_t & ROW_MASK] |
+        _COL_UP[(_t >> 16) & ROW_MASK] << 4 |
+        _COL_UP[(_t >> 32) & ROW_MASK] << 8 |
+        _COL_UP[(_t >> 48) & ROW_MASK] << 12
+    )
+# end def
+
+
+def move_down(board):
+    _t = transpose(board)
+    return (
+        _COL_DOWN[_t & ROW_MASK] |
+        _COL_DOWN[(_t >> 16) & ROW_MASK] << 4 |
+        _COL_DOWN[(_t >> 32) & ROW_MASK] << 8 |
+        _COL_DOWN[(_t >> 48) & ROW_MASK] << 12
+    )
+# end def
+
+
+_MOVES = (move_down, move_right, move_left, move_up)
+
+
+def move(board, direction):
+    return _MOVES[direction](board)
+# end def
+
+
+def _lines_score(lines, table):
+    return (
+        table[lines & ROW_MASK] +
+        table[(lines >> 16) & ROW_MASK] +
+        table[(lines >> 32) & ROW_MASK] +
+        table[(lines >> 48) & ROW_MASK]
+    )
+# end def
+
+
+def move_score(board, direction):
+    """
+        returns (new board, points scored by the merges of this move).
+    """
+    if direction == LEFT:
+        _score = _lines_score(board, _SCORE_LEFT)
+    elif direction == RIGHT:
+        _score = _lines_score(board, _SCORE_RIGHT)
+    elif direction == UP:
+        _score = _lines_score(transpose(board), _SCORE_LEFT)
+    else:
+        _score = _lines_score(transpose(board), _SCORE_RIGHT)
+    # end if
+    return _MOVES[direction](board), _score
+# end def
+
+
+def count_empty(board):
+    _x = board
+    _x |= (_x >> 2) & 0x3333333333333333
+    _x |= _x >> 1
+    _x = ~_x & 0x1111111111111111
+    return bin(_x).count("1")
+# end def
+
+
+def count_tiles(board):
+    return 16 - count_empty(board)
+# end def
+
+
+def empty_cells(board):
+    return [_i for _i in range(16) if not (board >> (4 * _i)) & 0xF]
+# end def
+
+
+def get_cell(board, row, column):
+    return (board >> (4 * (4 * row + column))) & 0xF
+# end def
+
+
+def set_cell(board, row, column, exponent):
+    _shift = 4 * (4 * row + column)
+    return (board & ~(0xF << _shift)) | ((exponent & 0xF) << _shift)
+# end def
+
+
+def max_exponent(board):
+    return max((board >> (4 * _i)) & 0xF for _i in range(16))
+# end def
+
+
+def can_move(board):
+    for _move in _MOVES:
+        if _move(board) != board:
+            return True
+        # end if
+    # end for
+    return False
+# end def
+
+
+def exponent(value):
+    return int(value).bit_length() - 1 if value else 0
+# end def
+
+
+def encode(matrix):
+    """
+        packs a 4x4 matrix of tile values (2, 4, 8...) into a board.
+    """
+    _board = 0
+    for _row in range(4):
+        for _column in range(4):
+            _exp = exponent(matrix[_row][_column])
+            _board |= _exp << (4 * (4 * _row + _column))
+        # end for
+    # end for
+    return _board
+# end def
+
+
+def decode(board):
+    """
+        unpacks a board into a 4x4 list of tile values (0 = empty).
+    """
+    _matrix = [[0] * 4 for _row in range(4)]
+    for _row in range(4):
+        for _column in range(4):
+            _exp = (board >> (4 * (4 * _row + _column))) & 0xF
+            _matrix[_row][_column] = (1 << _exp) if _exp else 0
+        # end for
+    # end for
+    return _matrix
+# end def
+
+
+def from_tiles(tiles):
+    """
+        packs a Game2048Grid tiles dict into a board.
+    """
+    _board = 0
+    for _t in tiles:
+        _tile = tiles[_t]
+        _board = set_cell(
+            _board, _tile.row, _tile.column, exponent(_tile.value)
+        )
+    # end for
+    return _board
+# end def
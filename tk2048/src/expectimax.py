@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Expectimax search over bitboards.
+
+    Max nodes pick the best of the four moves, chance nodes average
+    over every empty cell and both spawn values, weighted the same way
+    Game2048Grid.pop_tile draws them: random.choice([2, 4, 2, 2]).
+
+    The leaf evaluator is any callable taking a board and returning a
+    score (higher is better), e.g. AI.evaluate_leaf. An optional batch
+    evaluator scores the leaves below a max node in one call. Chance node
+    values are cached in an optional TranspositionTable, keyed on the
+    canonical board when the evaluator is symmetric.
+"""
+
+import time
+
+from . import bitboard as BB
+
+# (exponent, probability) of the tile popped after each move
+SPAWNS = ((1, 0.75), (2, 0.25))
+
+
+class Expectimax:
+    DEPTH = 2
+    MAX_DEPTH = 6   # for iterative_search
+    MAX_TIME = 0.010   # seconds per decision
+    # share of max_time left for the node running at the deadline to
+    # return and the caller to play the move
+    TIME_MARGIN = 0.1
+    MIN_PROBABILITY = 0.0001
+    GAME_OVER_SCORE = -1e9
+
+    def __init__(self, evaluator, **kw):
+        self.evaluator = evaluator
+        self.depth = kw.get("depth", self.DEPTH)
+        self.max_time = kw.get("max_time", self.MAX_TIME)
+        self.time_margin = kw.get("time_margin", self.TIME_MARGIN)
+        self.min_probability = kw.get("min_probability", self.MIN_PROBABILITY)
+        self.game_over_score = kw.get("game_over_score", self.GAME_OVER_SCORE)
+        # optional TranspositionTable shared across searches
+        self.table = kw.get("table")
+        # optional callable scoring a list of boards in one go
+        self.batch_evaluator = kw.get("batch_evaluator")
+        # the evaluator scores the 8 symmetric images of a board alike:
+        # cache them under one canonical key
+        self.symmetric = kw.get("symmetric", False)
+        self.nodes = 0
+        self.completed_depth = 0
+        self.timed_out = False
+        self._deadline = None
+    # end def
+
+    def search(self, board, depth=None):
+        """
+            returns (direction, value) of the best move, or (None, value)
+            when no move is possible. The moves are scored one ply deep
+            first, then searched to depth best first; once max_time is
+            spent the search stops, and the best move searched in full
+            wins, or the best one ply deep if none was.
+        """
+        self.start_clock()
+        _depth = self.depth if depth is None else depth
+        _scored = self.score_moves(board)
+        if not _scored:
+            return None, self.game_over_score
+        # end if
+        if _depth <= 1:
+            return _scored[0]
+        # end if
+        _deep = self.search_root(board, _depth, [_d for _d, _v in _scored])
+        return _deep if _deep[0] is not None else _scored[0]
+    # end def
+
+    def iterative_search(self, board, max_depth=None):
+        """
+            searches depth 1, 2, ... up to max_depth until max_time is
+            spent and returns (direction, value) from the deepest
+            iteration that completed; completed_depth tells which one.
+            Depth 1 always completes, an iteration cut short by the
+            clock is thrown away. Iterations reuse the transposition
+            table, if any.
+        """
+        _max_depth = self.MAX_DEPTH if max_depth is None else max_depth
+        self.start_clock()
+        self.completed_depth = 0
+        _scored = self.score_moves(board)
+        if len(_scored) <= 1:
+            # nothing to think about
+            return (_scored[0][0] if _scored else None), self.game_over_score
+        # end if
+        _result = _scored[0]
+        self.completed_depth = 1
+        _order = [_d for _d, _v in _scored]
+        for _depth in range(2, _max_depth + 1):
+            if self.out_of_time():
+                break
+            # end if
+            _iteration = self.search_root(board, _depth, _order)
+            if self.timed_out:
+                break
+            # end if
+            _result = _iteration
+            self.completed_depth = _depth
+        # end for
+        return _result
+    # end def
+
+    def start_clock(self):
+        self.nodes = 0
+        self.timed_out = False
+        if self.max_time:
+            self._deadline = time.perf_counter() + self.max_time * (1 - self.time_margin)
+        else:
+            self._deadline = None
+        # end if
+    # end def
+
+    def score_moves(self, board):
+        """
+            [(direction, value)] of the possible moves one ply deep,
+            best first, in a single evaluator call; never cut short.
+        """
+        _moves = [
+            (_direction, BB.move(board, _direction))
+            for _direction in BB.DIRECTIONS
+            if BB.move(board, _direction) != board
+        ]
+        if self.batch_evaluator is not None and _moves:
+            _values = self.batch_evaluator([_moved for _d, _moved in _moves])
+        else:
+            _values = [self.evaluator(_moved) for _d, _moved in _moves]
+        # end if
+        self.nodes += len(_moves)
+        _scored = [(_d, _value) for (_d, _moved), _value in zip(_moves, _values)]
+        _scored.sort(key=lambda _item: -_item[1])
+        return _scored
+    # end def
+
+    def search_root(self, board, depth, order):
+        """
+            searches the moves in order to depth and returns the best
+            one whose search completed before max_time ran out, or
+            (None, game_over_score) if none did.
+        """
+        _best, _best_value = None, self.game_over_score
+        for _direction in order:
+            _value = self.chance_node(BB.move(board, _direction), depth, 1.0)
+            if self.timed_out:
+                # a move cut short by the clock can't be compared
+                break
+            # end if
+            if _best is None or _value > _best_value:
+                _best, _best_value = _direction, _value
+            # end if
+        # end for
+        return _best, _best_value
+    # end def
+
+    def out_of_time(self):
+        if not self.timed_out and self._deadline:
+            self.timed_out = time.perf_counter() > self._deadline
+        # end if
+        return self.timed_out
+    # end def
+
+    def max_node(self, board, depth, probability):
+        self.nodes += 1
+        if self.out_of_time():
+            # the value is thrown away, don't spend any more time on it
+            return 0.0
+        # end if
+        if depth <= 1 and self.batch_evaluator is not None:
+            return self.leaf_max_node(board)
+        # end if
+        _best_value = None
+        for _direction in BB.DIRECTIONS:
+            _moved = BB.move(board, _direction)
+            if _moved == board:
+                continue
+            # end if
+            _value = self.chance_node(_moved, depth, probability)
+            if _best_value is None or _value > _best_value:
+                _best_value = _value
+            # end if
+        # end for
+        if _best_value is None:
+            return self.game_over_score
+        # end if
+        return _best_value
+    # end def
+
+    def table_key(self, board):
+        if self.symmetric:
+            return BB.canonical(board)[0]
+        # end if
+        return board
+    # end def
+
+    def leaf_max_node(self, board):
+        """
+            max node whose children are all leaves: score every move
+            with a single batch_evaluator call.
+        """
+        _table = self.table
+        _best_value = None
+        _frontier = []
+        for _direction in BB.DIRECTIONS:
+            _moved = BB.move(board, _direction)
+            if _moved == board:
+                continue
+            # end if
+            _value = None if _table is None else _table.get(self.table_key(_moved), 1)
+            if _value is None:
+                _frontier.append(_moved)
+            elif _best_value is None or _value > _best_value:
+                _best_value = _value
+            # end if
+        # end for
+        if _frontier:
+            self.nodes += len(_frontier)
+            for _moved, _value in zip(_frontier, self.batch_evaluator(_frontier)):
+                if _table is not None:
+                    _table.put(self.table_key(_moved), 1, _value)
+                # end if
+                if _best_value is None or _value > _best_value:
+                    _best_value = _value
+                # end if
+            # end for
+        # end if
+        if _best_value is None:
+            return self.game_over_score
+        # end if
+        return _best_value
+    # end def
+
+    def chance_node(self, board, depth, probability):
+        if self.out_of_time():
+            return 0.0
+        # end if
+        _leaf = depth <= 1 or probability < self.min_probability
+        _depth = 1 if _leaf else depth
+        _table = self.table
+        if _table is not None:
+            _key = self.table_key(board)
+            _value = _table.get(_key, _depth)
+            if _value is not None:
+                return _value
+            # end if
+        # end if
+        self.nodes += 1
+        _cells = None if _leaf else BB.empty_cells(board)
+        if _cells:
+            _weight = 1.0 / len(_cells)
+            _total = 0.0
+            for _cell in _cells:
+                _shift = 4 * _cell
+                for _exp, _p in SPAWNS:
+                    _total += _p * self.max_node(
+                        board | (_exp << _shift),
+                        depth - 1,
+                        probability * _p * _weight,
+                    )
+                # end for
+            # end for
+            _value = _total * _weight
+        else:
+            _value = self.evaluator(board)
+            _depth = 1
+        # end if
+        # values cut short by the time budget are not worth keeping
+        if _table is not None and not self.timed_out:
+            _table.put(_key, _depth, _value)
+        # end if
+        return _value
+    # end def
+
+# end class
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    2048 AI, moved out of game.py so it can run without Tk.
+
+    ai_move scores the four moves greedily, search_move runs a fixed
+    depth expectimax search and think_move an iterative-deepening one
+    within a time budget; all return 0 = down, 1 = right, 2 = left,
+    3 = up.
+"""
+
+import logging
+
+import numpy as np
+
+from . import bitboard as BB
+from . import expectimax as EM
+from . import transposition as TT
+from . import heuristics as HE
+
+log = logging.getLogger(__name__)
+
+
+class AI:
+    # ai_move 中两项评价的权重
+    NUM_WEIGHT = 2.0
+    POSITION_WEIGHT = 1.0 / 5.0
+    # 搜索叶子节点的评价权重：空格、单调和平滑，不用只看位置的模板。
+    # simulate.py --policy iterative --depth 6 --max-time 0.05 --games 8 的
+    # 平均分：模板 9187，这组权重 22828，贪心的 ai_move 11698
+    SEARCH_WEIGHTS = dict(snake=0.0, corner=0.0, empty=10.0,
+                          monotonicity=1.0, smoothness=0.1)
+
+    def __init__(self, tiles=None, board=None, **kw):
+        self.tiles = tiles
+        # 64位的位棋盘，每个格子4位存放方块的指数
+        if board is None:
+            board = BB.from_tiles(tiles or {})
+        self.board = board
+        self.num_weight = kw.get("num_weight", self.NUM_WEIGHT)
+        self.position_weight = kw.get("position_weight", self.POSITION_WEIGHT)
+        # ai_move 的模板评价权重，见 heuristics.WEIGHTS
+        self.weights = kw.get("weights")
+        # search_move / think_move 叶子节点的评价权重
+        self.search_weights = kw.get("search_weights", self.SEARCH_WEIGHTS)
+        # 可选的 TraceWriter，记录每一步的决策
+        self.trace = kw.get("trace")
+        # 用于模板评价的矩阵
+        self.matrix = np.zeros((4, 4))
+        # 搜索时缓存已经评价过的局面，跨步保留
+        self.table = TT.TranspositionTable()
+        # 评价函数对旋转/翻转对称时，缓存按规范化的棋盘存取，命中率最多提高8倍
+        self.searcher = EM.Expectimax(self.evaluate_leaf, table=self.table,
+                                      batch_evaluator=self.evaluate_leaves,
+                                      symmetric=HE.is_symmetric(self.search_weights))
+        self.rows = 4
+        self.columns = 4
+
+        # 矩阵能否进行上下左右移动的标志
+        self.flags = [0, 0, 0, 0]
+
+    # 长期使用同一个AI：开新局时重置棋盘，缓存保留
+    def reset(self, board=0):
+        self.board = board
+
+    # 根据界面报告的移动增量更新棋盘
+    def apply_move(self, direction):
+        self.board = BB.move(self.board, direction)
+
+    # 根据界面报告的新方块增量更新棋盘
+    def apply_spawn(self, row, column, value):
+        self.board = BB.set_cell(self.board, row, column, BB.exponent(value))
+
+    # 对各个方向的移动进行评价，并得出最优操作
+    def ai_move(self):
+        score = [0, 0, 0, 0]
+        score_num = [0, 0, 0, 0]
+        score_position = [0, 0, 0, 0]
+        self.flags = [0, 0, 0, 0]
+
+        score_num[0], score_position[0] = self.evaluate_move_down()
+        score_num[1], score_position[1] = self.evaluate_move_right()
+        score_num[2], score_position[2] = self.evaluate_move_left()
+        score_num[3], score_position[3] = self.evaluate_move_up()
+
+        for i in range(4):
+            score[i] = score_num[i] * self.num_weight + score_position[i] * self.position_weight
+
+        i = 0
+        for j in range(0, 4):
+            if self.flags[i] == 0:
+                i = j
+            if (score[i] < score[j]) and (self.flags[j] == 1):
+                i = j
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("num: %s pos: %s score: %s flag: %s -> %d",
+                      score_num, score_position, score, self.flags, i)
+        if self.trace is not None:
+            self.trace.record(policy="greedy", board=self.board, move=i,
+                              num=score_num, position=score_position,
+                              flags=self.flags)
+        return i
+
+    # 用期望最大搜索选择移动，考虑随机出现的2和4，叶子节点用 search_weights 评价
+    def search_move(self, depth=2, max_time=0.010):
+        searcher = self.searcher
+        searcher.depth = depth
+        searcher.max_time = max_time
+        direction, value = searcher.search(self.board)
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("search: %s value %s, %d nodes%s, cache %d hits %d misses",
+                      direction, value, searcher.nodes,
+                      " (timed out)" if searcher.timed_out else "",
+                      self.table.hits, self.table.misses)
+        if self.trace is not None:
+            self.trace.record(policy="expectimax", board=self.board, move=direction,
+                              value=value, nodes=searcher.nodes,
+                              timed_out=searcher.timed_out)
+
+        if direction is None:
+            return 0
+        return direction
+
+    # 迭代加深搜索：在时间预算内逐层加深，返回最深一层完整搜索的结果
+    def think_move(self, max_time=0.050, max_depth=6):
+        searcher = self.searcher
+        searcher.max_time = max_time
+        direction, value = searcher.iterative_search(self.board, max_depth)
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("think: %s value %s, depth %d, %d nodes",
+                      direction, value, searcher.completed_depth, searcher.nodes)
+        if self.trace is not None:
+            self.trace.record(policy="iterative", board=self.board, move=direction,
+                              value=value, nodes=searcher.nodes,
+                              depth=searcher.completed_depth)
+
+        if direction is None:
+            return 0
+        return direction
+
+    # 用模板评价一个位棋盘
+    def evaluate_board(self, board):
+        return float(HE.evaluate_bitboards([board], self.weights)[0])
+
+    # 搜索的叶子节点评价函数
+    def evaluate_leaf(self, board):
+        return float(HE.evaluate_bitboards([board], self.search_weights)[0])
+
+    # 一次评价一批叶子节点
+    def evaluate_leaves(self, boards):
+        return HE.evaluate_bitboards(boards, self.search_weights).tolist()
+
+    # 把位棋盘解码到矩阵中
+    def set_board(self, board):
+        self.matrix = np.array(BB.decode(board), dtype=float)
+
+    # 利用模板对矩阵元素位置进行评价，模板见 heuristics.SNAKE_ORDER
+    def evaluate_position(self):
+        return float(HE.evaluate_batch(self.matrix)[0])
+
+    # 评估某个方向的移动：模板得分，以及再走一步最多能消掉的方块数
+    def evaluate_move(self, direction):
+        num = [0, 0, 0, 0]
+        num1 = BB.count_tiles(self.board)
+        moved = BB.move(self.board, direction)
+        self.flags[direction] = int(moved != self.board)
+        score = self.evaluate_board(moved)
+
+        for d in BB.DIRECTIONS:
+            num[d] = num1 - BB.count_tiles(BB.move(moved, d))
+
+        return max(num), score
+
+    # 评估向下移动
+    def evaluate_move_down(self):
+        return self.evaluate_move(BB.DOWN)
+
+    # 评估向右移动
+    def evaluate_move_right(self):
+        return self.evaluate_move(BB.RIGHT)
+
+    # 评估向左移动
+    def evaluate_move_left(self):
+        return self.evaluate_move(BB.LEFT)
+
+    # 评估向上移动
+    def evaluate_move_up(self):
+        return self.evaluate_move(BB.UP)
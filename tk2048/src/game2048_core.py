@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Headless 2048 game core.
+
+    Game2048 holds the whole game state (board, score, move count and
+    its own seeded random generator) and applies the rules without any
+    display: Game2048Grid is only a Tk view over it, and AI games can
+    run without Tk at all.
+
+    Directions are the bitboard ones: DOWN, RIGHT, LEFT, UP.
+"""
+
+import random
+
+from . import bitboard as BB
+
+DOWN, RIGHT, LEFT, UP = BB.DIRECTIONS
+
+
+class Game2048:
+    ROWS = COLUMNS = 4
+    START_TILES = 2
+    SPAWN_VALUES = (2, 4, 2, 2)
+
+    def __init__(self, seed=None, board=0):
+        self.seed(seed)
+        self.reset(board)
+    # end def
+
+    def seed(self, seed=None):
+        self.rng = random.Random(seed)
+    # end def
+
+    def reset(self, board=0):
+        self.board = board
+        self.score = 0
+        self.moves = 0
+    # end def
+
+    def new_game(self):
+        self.reset()
+        for _n in range(self.START_TILES):
+            self.spawn()
+        # end for
+    # end def
+
+    def can_move(self, direction=None):
+        if direction is None:
+            return BB.can_move(self.board)
+        # end if
+        return BB.move(self.board, direction) != self.board
+    # end def
+
+    def empty_cells(self):
+        return [divmod(_i, self.COLUMNS) for _i in BB.empty_cells(self.board)]
+    # end def
+
+    def get_value(self, row, column):
+        _exp = BB.get_cell(self.board, row, column)
+        return (1 << _exp) if _exp else 0
+    # end def
+
+    def is_full(self):
+        return not BB.count_empty(self.board)
+    # end def
+
+    def is_game_over(self):
+        return not BB.can_move(self.board)
+    # end def
+
+    @property
+    def max_tile(self):
+        _exp = BB.max_exponent(self.board)
+        return (1 << _exp) if _exp else 0
+    # end def
+
+    def move(self, direction):
+        """
+            slides and fuses tiles; returns True if the board changed.
+            No tile is popped, see spawn() and play().
+        """
+        _board, _points = BB.move_score(self.board, direction)
+        if _board == self.board:
+            return False
+        # end if
+        self.board = _board
+        self.score += _points
+        self.moves += 1
+        return True
+    # end def
+
+    def play(self, direction):
+        """
+            one full turn: move, then pop a tile if anything moved.
+        """
+        _acted = self.move(direction)
+        if _acted:
+            self.spawn()
+        # end if
+        return _acted
+    # end def
+
+    def plan_move(self, direction):
+        """
+            tile transitions of a move, without applying it.
+
+            returns a list of (from_row_column, to_row_column,
+            fused_row_column) tuples, fused_row_column being the tile
+            absorbed into the moving one or None. Replaying them in
+            order never moves a tile onto an occupied cell.
+        """
+        _events = []
+        for _line in self._lines(direction):
+            _tiles = [
+                _rc for _rc in _line if BB.get_cell(self.board, *_rc)
+            ]
+            _i = _k = 0
+            while _i < len(_tiles):
+                _from = _tiles[_i]
+                _fused = None
+                if _i + 1 < len(_tiles):
+                    _exp = BB.get_cell(self.board, *_from)
+                    if (_exp != 0xF and
+                            _exp == BB.get_cell(self.board, *_tiles[_i + 1])):
+                        _fused = _tiles[_i + 1]
+                    # end if
+                # end if
+                if _fused or _from != _line[_k]:
+                    _events.append((_from, _line[_k], _fused))
+                # end if
+                _i += 2 if _fused else 1
+                _k += 1
+            # end while
+        # end for
+        return _events
+    # end def
+
+    def _lines(self, direction):
+        _rows, _columns = range(self.ROWS), range(self.COLUMNS)
+        if direction == LEFT:
+            return [[(_r, _c) for _c in _columns] for _r in _rows]
+        elif direction == RIGHT:
+            return [[(_r, _c) for _c in reversed(_columns)] for _r in _rows]
+        elif direction == UP:
+            return [[(_r, _c) for _r in _rows] for _c in _columns]
+        # end if
+        return [[(_r, _c) for _r in reversed(_rows)] for _c in _columns]
+    # end def
+
+    def set_value(self, row, column, value):
+        self.board = BB.set_cell(self.board, row, column, BB.exponent(value))
+    # end def
+
+    def spawn(self):
+        """
+            pops a 2 (or, one time in four, a 4) on a random empty cell;
+            returns (row, column, value) or None if the board is full.
+        """
+        _cells = BB.empty_cells(self.board)
+        if not _cells:
+            return None
+        # end if
+        _value = self.rng.choice(self.SPAWN_VALUES)
+        _row, _column = divmod(self.rng.choice(_cells), self.COLUMNS)
+        self.set_value(_row, _column, _value)
+        return (_row, _column, _value)
+    # end def
+
+    def values(self):
+        return BB.decode(self.board)
+    # end def
+
+# end class
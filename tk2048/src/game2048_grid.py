@@ -24,8 +24,6 @@
     If not, see http://www.gnu.org/licenses/
 """
 
-import random
-
 try:
     import Tkinter as tk
     import ttk
@@ -35,6 +33,7 @@ except:
 # end try
 
 from . import game_grid as GG
+from . import game2048_core as GC
 
 
 class Game2048Grid (GG.GameGrid):
@@ -76,6 +75,11 @@ class Game2048Grid (GG.GameGrid):
         # end if
     # end def
 
+    def clear_all(self, tk_event=None, *args, **kw):
+        GG.GameGrid.clear_all(self, tk_event, *args, **kw)
+        self.game.reset()
+    # end def
+
     def fuse_tiles(self, into_tile, void_tile):
         _into, _void = into_tile, void_tile
         if _into and _void and (_into.value == _void.value):
@@ -134,25 +138,14 @@ class Game2048Grid (GG.GameGrid):
         )
     # end def
 
-    def get_available_box(self):
-        if self.is_full():
-            raise GG.GridError("no more room in grid")
-        else:
-            _at = self.matrix.get_object_at
-            while True:
-                _row = random.randrange(self.rows)
-                _column = random.randrange(self.columns)
-                if not _at(_row, _column):
-                    break
-                # end if
-            # end while
-            return (_row, _column)
-        # end if - no more room
-    # end def
-
     def init_widget(self, **kw):
         self.__score_cvar = tk.IntVar()
         self.__score_callback = None
+        self.__move_callback = None
+        self.__spawn_callback = None
+        # game rules and state live in the headless core, this grid
+        # only mirrors them on the canvas
+        self.game = GC.Game2048()
     # end def
 
     def move_tile(self, tile, row, column):
@@ -162,132 +155,39 @@ class Game2048Grid (GG.GameGrid):
         # end if
     # end def
 
-    def move_tiles_down(self):
+    def move_tiles(self, direction):
+        _events = self.game.plan_move(direction)
+        _acted = self.game.move(direction)
         _at = self.matrix.get_object_at
-        _acted = False
-        for _column in range(self.columns):
-            for _row in range(self.rows - 1, -1, -1):
-                _tile1 = _at(_row, _column)
-                if _tile1:
-                    for _row2 in range(_row - 1, -1, -1):
-                        _tile2 = _at(_row2, _column)
-                        if self.fuse_tiles(_tile1, _tile2):
-                            _acted = True
-                        # end if
-                        if _tile2:
-                            break
-                    # end for - next tile
-                # end if - tile
-            # end for - fusions
-            _empty = None
-            for _row in range(self.rows - 1, -1, -1):
-                _tile1 = _at(_row, _column)
-                if not _tile1 and not _empty:
-                    _empty = (_row, _column)
-                elif _tile1 and _empty:
-                    self.move_tile(_tile1, *_empty)
-                    _empty = (_empty[0] - 1, _column)
-                    _acted = True
-                # end if
-            # end for - scrollings
-        # end for - row
+        for _from, _to, _fused in _events:
+            _tile = _at(*_from)
+            if _fused:
+                self.fuse_tiles(_tile, _at(*_fused))
+            # end if
+            if _from != _to:
+                self.move_tile(_tile, *_to)
+            # end if
+        # end for
+        if _acted and callable(self.__move_callback):
+            self.__move_callback(direction)
+        # end if
         self.next_tile(acted=_acted)
     # end def
 
+    def move_tiles_down(self):
+        self.move_tiles(GC.DOWN)
+    # end def
+
     def move_tiles_left(self):
-        _at = self.matrix.get_object_at
-        _acted = False
-        for _row in range(self.rows):
-            for _column in range(self.columns - 1):
-                _tile1 = _at(_row, _column)
-                if _tile1:
-                    for _col in range(_column + 1, self.columns):
-                        _tile2 = _at(_row, _col)
-                        if self.fuse_tiles(_tile1, _tile2):
-                            _acted = True
-                        # end if
-                        if _tile2:
-                            break
-                    # end for - next tile
-                # end if - tile
-            # end for - fusions
-            _empty = None
-            for _column in range(self.columns):
-                _tile1 = _at(_row, _column)
-                if not _tile1 and not _empty:
-                    _empty = (_row, _column)
-                elif _tile1 and _empty:
-                    self.move_tile(_tile1, *_empty)
-                    _empty = (_row, _empty[1] + 1)
-                    _acted = True
-                # end if
-            # end for - scrollings
-        # end for - row
-        self.next_tile(acted=_acted)
+        self.move_tiles(GC.LEFT)
     # end def
 
     def move_tiles_right(self):
-        _at = self.matrix.get_object_at
-        _acted = False
-        for _row in range(self.rows):
-            for _column in range(self.columns - 1, -1, -1):
-                _tile1 = _at(_row, _column)
-                if _tile1:
-                    for _col in range(_column - 1, -1, -1):
-                        _tile2 = _at(_row, _col)
-                        if self.fuse_tiles(_tile1, _tile2):
-                            _acted = True
-                        # end if
-                        if _tile2:
-                            break
-                    # end for - next tile
-                # end if - tile
-            # end for - fusions
-            _empty = None
-            for _column in range(self.columns - 1, -1, -1):
-                _tile1 = _at(_row, _column)
-                if not _tile1 and not _empty:
-                    _empty = (_row, _column)
-                elif _tile1 and _empty:
-                    self.move_tile(_tile1, *_empty)
-                    _empty = (_row, _empty[1] - 1)
-                    _acted = True
-                # end if
-            # end for - scrollings
-        # end for - row
-        self.next_tile(acted=_acted)
+        self.move_tiles(GC.RIGHT)
     # end def
 
     def move_tiles_up(self):
-        _at = self.matrix.get_object_at
-        _acted = False
-        for _column in range(self.columns):
-            for _row in range(self.rows - 1):
-                _tile1 = _at(_row, _column)
-                if _tile1:
-                    for _row2 in range(_row + 1, self.rows):
-                        _tile2 = _at(_row2, _column)
-                        if self.fuse_tiles(_tile1, _tile2):
-                            _acted = True
-                        # end if
-                        if _tile2:
-                            break
-                    # end for - next tile
-                # end if - tile
-            # end for - fusions
-            _empty = None
-            for _row in range(self.rows):
-                _tile1 = _at(_row, _column)
-                if not _tile1 and not _empty:
-                    _empty = (_row, _column)
-                elif _tile1 and _empty:
-                    self.move_tile(_tile1, *_empty)
-                    _empty = (_empty[0] + 1, _column)
-                    _acted = True
-                # end if
-            # end for - scrollings
-        # end for - row
-        self.next_tile(acted=_acted)
+        self.move_tiles(GC.UP)
     # end def
 
     def next_tile(self, tk_event=None, *args, **kw):
@@ -300,39 +200,27 @@ class Game2048Grid (GG.GameGrid):
     # end def
 
     def no_more_hints(self):
-        if self.is_full():
-            _at = self.matrix.get_object_at
-            for _row in range(self.rows):
-                for _column in range(self.columns):
-                    _tile1 = _at(_row, _column)
-                    _tile2 = _at(_row, _column + 1)
-                    _tile3 = _at(_row + 1, _column)
-                    if _tile1 and (
-                        (_tile2 and _tile1.value == _tile2.value) or
-                            (_tile3 and _tile1.value == _tile3.value)):
-                        return False
-                    # end if
-                # end for - columns
-            # end for - rows
-            return True
-        # end if - no more room
-        return False
+        return self.game.is_game_over()
     # end def
 
     def pop_tile(self, tk_event=None, *args, **kw):
-        if not self.is_full():
-            _value = random.choice([2, 4, 2, 2])
-            _row, _column = self.get_available_box()
+        _spawned = self.game.spawn()
+        if _spawned:
+            _row, _column, _value = _spawned
             _tile = Game2048GridTile(self, _value, _row, _column)
             _tile.animate_show()
             self.register_tile(_tile.id, _tile)
             self.matrix.add(_tile, *_tile.row_column, raise_error=True)
+            if callable(self.__spawn_callback):
+                self.__spawn_callback(_row, _column, _value)
+            # end if
         # end if - room in grid
     # end def
 
     def restore(self, tiles):
         self.clear_tiles()
         self.matrix.reset_matrix()
+        self.game.reset()
         for t in tiles:
             _value = tiles[t].value
             _row = tiles[t].row
@@ -341,6 +229,33 @@ class Game2048Grid (GG.GameGrid):
             _tile.animate_show()
             self.register_tile(_tile.id, _tile)
             self.matrix.add(_tile, *_tile.row_column, raise_error=True)
+            self.game.set_value(_row, _column, _value)
+
+    def set_move_callback(self, callback, raise_error=False):
+        """
+            callback(direction) after each move that changed the board.
+        """
+        if callable(callback):
+            self.__move_callback = callback
+        elif raise_error:
+            raise TypeError(
+                "callback parameter *MUST* be a callable object."
+            )
+        # end if
+    # end def
+
+    def set_spawn_callback(self, callback, raise_error=False):
+        """
+            callback(row, column, value) after each popped tile.
+        """
+        if callable(callback):
+            self.__spawn_callback = callback
+        elif raise_error:
+            raise TypeError(
+                "callback parameter *MUST* be a callable object."
+            )
+        # end if
+    # end def
 
     def set_score_callback(self, callback, raise_error=False):
         if callable(callback):
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    JSONL trace of AI decisions.
+
+    TraceWriter buffers one record per decision and writes them to a
+    file batch_size at a time, so long AI runs can be replayed later
+    without paying for a synchronous write on every move. The file is
+    started over on open: a trace only ever holds one run, or one game
+    of a tournament. Boards are stored as their 64-bit bitboard integer.
+"""
+
+import json
+
+
+class TraceWriter:
+    BATCH_SIZE = 256
+
+    def __init__(self, path, batch_size=None):
+        self.path = path
+        self.batch_size = max(1, int(batch_size or self.BATCH_SIZE))
+        self.__buffer = []
+        self.__file = open(path, "w")
+    # end def
+
+    def __enter__(self):
+        return self
+    # end def
+
+    def __exit__(self, *args):
+        self.close()
+    # end def
+
+    def close(self):
+        if self.__file:
+            self.flush()
+            self.__file.close()
+            self.__file = None
+        # end if
+    # end def
+
+    def flush(self):
+        if self.__buffer and self.__file:
+            self.__file.write("".join(self.__buffer))
+            self.__file.flush()
+            self.__buffer = []
+        # end if
+    # end def
+
+    def record(self, **fields):
+        self.__buffer.append(json.dumps(fields, separators=(",", ":")) + "\n")
+        if len(self.__buffer) >= self.batch_size:
+            self.flush()
+        # end if
+    # end def
+
+# end class
+
+
+def read_trace(path):
+    """
+        yields the records of a trace file, in order.
+    """
+    with open(path) as _file:
+        for _line in _file:
+            if _line.strip():
+                yield json.loads(_line)
+            # end if
+        # end for
+    # end with
+# end def
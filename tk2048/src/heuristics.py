@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Vectorized board heuristics for the 2048 AI.
+
+    Every function takes a batch of boards and returns one score per
+    board, so a whole search frontier is scored in a single NumPy call.
+    Boards may be given as an (N, 4, 4) or (N, 16) array of tile values
+    (2, 4, 8..., 0 = empty), or as bitboards through evaluate_bitboards.
+"""
+
+import numpy as np
+
+# cells of the snake template used by AI.evaluate_position, best first
+SNAKE_ORDER = np.array([
+    15, 14, 13, 9,
+    10, 11, 7, 6,
+    5, 12, 8, 4,
+    3, 2, 1, 0,
+])
+CORNER = 15   # (3, 3)
+
+_I, _J = np.indices((16, 16))
+# template position j after i holding a larger tile than i
+_UPPER = _J > _I
+# template position j before i - 1 holding a smaller tile than i
+_LOWER = (_J < _I - 1) & (_I < 15)
+
+_SHIFTS = np.arange(0, 64, 4, dtype=np.uint64)
+
+WEIGHTS = dict(
+    snake=1.0,
+    corner=1.0,
+    empty=0.0,
+    monotonicity=0.0,
+    smoothness=0.0,
+)
+
+
+# heuristics that score the 8 rotations / reflections of a board alike
+SYMMETRIC = ("empty", "monotonicity", "smoothness")
+
+
+def is_symmetric(weights=None):
+    """
+        True if evaluate_batch with these weights gives the same score
+        to every symmetric image of a board, so that caches may key on
+        bitboard.canonical().
+    """
+    _weights = dict(WEIGHTS)
+    _weights.update(weights or {})
+    return not any(
+        _value for _name, _value in _weights.items()
+        if _name not in SYMMETRIC
+    )
+# end def
+
+
+def as_batch(boards):
+    _boards = np.asarray(boards, dtype=float)
+    if _boards.ndim == 2 and _boards.shape == (4, 4):
+        _boards = _boards[np.newaxis]
+    # end if
+    return _boards.reshape(-1, 16)
+# end def
+
+
+def unpack_bitboards(boards):
+    """
+        (N,) bitboards -> (N, 16) array of tile values.
+    """
+    _boards = np.asarray(boards, dtype=np.uint64).reshape(-1, 1)
+    _exps = ((_boards >> _SHIFTS) & np.uint64(0xF)).astype(np.int64)
+    return np.where(_exps > 0, np.left_shift(1, _exps), 0).astype(float)
+# end def
+
+
+def _log_values(cells):
+    return np.log2(np.where(cells > 0, cells, 1))
+# end def
+
+
+def snake_score(boards):
+    """
+        inversions against the snake template, the same count as
+        AI.evaluate_position without its corner penalty.
+    """
+    _seq = as_batch(boards)[:, SNAKE_ORDER]
+    _diff = _seq[:, np.newaxis, :] - _seq[:, :, np.newaxis]
+    _inversions = (
+        ((_diff > 0) & _UPPER).sum(axis=(1, 2)) +
+        ((_diff < 0) & _LOWER).sum(axis=(1, 2))
+    )
+    return -_inversions.astype(float)
+# end def
+
+
+def corner_penalty(boards):
+    """
+        -10 * max tile when the max tile is not in the (3, 3) corner.
+    """
+    _cells = as_batch(boards)
+    _max = _cells.max(axis=1)
+    return np.where(_cells[:, CORNER] < _max, -10.0 * _max, 0.0)
+# end def
+
+
+def empty_cells(boards):
+    return (as_batch(boards) == 0).sum(axis=1).astype(float)
+# end def
+
+
+def monotonicity(boards):
+    """
+        0 for boards whose rows and columns are all monotonic, more
+        negative the more each line goes both up and down (log2 scale).
+    """
+    _logs = _log_values(as_batch(boards)).reshape(-1, 4, 4)
+    _score = np.zeros(len(_logs))
+    for _lines in (_logs, _logs.transpose(0, 2, 1)):
+        _diff = np.diff(_lines, axis=2)
+        _up = np.where(_diff > 0, _diff, 0).sum(axis=2)
+        _down = np.where(_diff < 0, -_diff, 0).sum(axis=2)
+        _score -= np.minimum(_up, _down).sum(axis=1)
+    # end for
+    return _score
+# end def
+
+
+def smoothness(boards):
+    """
+        minus the log2 gap between neighbouring non-empty tiles.
+    """
+    _cells = as_batch(boards).reshape(-1, 4, 4)
+    _score = np.zeros(len(_cells))
+    for _lines in (_cells, _cells.transpose(0, 2, 1)):
+        _logs = _log_values(_lines)
+        _both = (_lines[:, :, 1:] > 0) & (_lines[:, :, :-1] > 0)
+        _gap = np.abs(_logs[:, :, 1:] - _logs[:, :, :-1])
+        _score -= np.where(_both, _gap, 0).sum(axis=(1, 2))
+    # end for
+    return _score
+# end def
+
+
+def evaluate_batch(boards, weights=None):
+    """
+        weighted sum of the heuristics above, one score per board.
+        With the default WEIGHTS this equals AI.evaluate_position.
+    """
+    _weights = dict(WEIGHTS)
+    _weights.update(weights or {})
+    _cells = as_batch(boards)
+    _score = np.zeros(len(_cells))
+    for _name, _function in (
+            ("snake", snake_score),
+            ("corner", corner_penalty),
+            ("empty", empty_cells),
+            ("monotonicity", monotonicity),
+            ("smoothness", smoothness)):
+        if _weights[_name]:
+            _score += _weights[_name] * _function(_cells)
+        # end if
+    # end for
+    return _score
+# end def
+
+
+def evaluate_bitboards(boards, weights=None):
+    return evaluate_batch(unpack_bitboards(boards), weights)
+# end def
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    Transposition table for the 2048 AI search.
+
+    Entries are keyed on a board encoding (the 64-bit bitboard) and
+    hold the searched value together with the depth it was searched
+    to; a lookup only hits when the stored depth is at least the
+    requested one.
+
+    The table never holds more than max_entries entries. Two eviction
+    policies are available:
+
+    * "lru": drop the least recently used entry when full;
+    * "depth": direct-mapped slots, a new entry only replaces the slot
+      owner when it was searched at least as deep.
+"""
+
+from collections import OrderedDict
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_GOLDEN = 0x9E3779B97F4A7C15
+
+
+def _mix(key):
+    # bitboards differ mostly in their high nibbles, spread them out
+    # before picking a slot
+    return (((hash(key) & _MASK64) * _GOLDEN) & _MASK64) >> 16
+# end def
+
+
+class TranspositionTable:
+    LRU = "lru"
+    DEPTH = "depth"
+    MAX_ENTRIES = 1 << 18
+
+    def __init__(self, max_entries=None, policy=LRU):
+        self.max_entries = max(1, int(max_entries or self.MAX_ENTRIES))
+        if policy not in (self.LRU, self.DEPTH):
+            raise ValueError(
+                "unknown eviction policy '{p}'.".format(p=policy)
+            )
+        # end if
+        self.policy = policy
+        self.clear()
+    # end def
+
+    def __len__(self):
+        if self.policy == self.LRU:
+            return len(self.__entries)
+        # end if
+        return self.__used
+    # end def
+
+    def clear(self):
+        if self.policy == self.LRU:
+            self.__entries = OrderedDict()
+        else:
+            self.__slots = [None] * self.max_entries
+            self.__used = 0
+        # end if
+        self.reset_stats()
+    # end def
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    # end def
+
+    @property
+    def hit_rate(self):
+        _lookups = self.hits + self.misses
+        return self.hits / _lookups if _lookups else 0.0
+    # end def
+
+    def get(self, key, depth):
+        """
+            returns the stored value if key was searched to at least
+            depth, None otherwise.
+        """
+        if self.policy == self.LRU:
+            _entry = self.__entries.get(key)
+            if _entry is not None and _entry[0] >= depth:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return _entry[1]
+            # end if
+        else:
+            _entry = self.__slots[_mix(key) % self.max_entries]
+            if _entry is not None and _entry[0] == key and _entry[1] >= depth:
+                self.hits += 1
+                return _entry[2]
+            # end if
+        # end if
+        self.misses += 1
+        return None
+    # end def
+
+    def put(self, key, depth, value):
+        if self.policy == self.LRU:
+            _entries = self.__entries
+            _entry = _entries.get(key)
+            if _entry is not None:
+                if _entry[0] > depth:
+                    return
+                # end if
+                _entries.move_to_end(key)
+            elif len(_entries) >= self.max_entries:
+                _entries.popitem(last=False)
+                self.evictions += 1
+            # end if
+            _entries[key] = (depth, value)
+        else:
+            _slot = _mix(key) % self.max_entries
+            _entry = self.__slots[_slot]
+            if _entry is None:
+                self.__used += 1
+            elif _entry[0] != key:
+                if _entry[1] > depth:
+                    return
+                # end if
+                self.evictions += 1
+            elif _entry[1] > depth:
+                return
+            # end if
+            self.__slots[_slot] = (key, depth, value)
+        # end if
+    # end def
+
+    def stats(self):
+        return dict(
+            entries=len(self), max_entries=self.max_entries,
+            policy=self.policy, hits=self.hits, misses=self.misses,
+            evictions=self.evictions, hit_rate=self.hit_rate,
+        )
+    # end def
+
+# end class
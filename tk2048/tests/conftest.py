@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# the AI modules are imported as the src package, as from tk2048/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
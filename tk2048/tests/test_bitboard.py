@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+from src import bitboard as BB
+
+
+def random_board(rng, tiles=10):
+    _board = 0
+    for _cell in rng.sample(range(16), tiles):
+        _board |= rng.randint(1, 11) << (4 * _cell)
+    # end for
+    return _board
+# end def
+
+
+def slide_left(row):
+    """
+        reference move of one row of exponents: returns (row, points).
+    """
+    _tiles = [_e for _e in row if _e]
+    _out, _points = [], 0
+    while _tiles:
+        if len(_tiles) > 1 and _tiles[0] == _tiles[1]:
+            _out.append(_tiles[0] + 1)
+            _points += 1 << (_tiles[0] + 1)
+            _tiles = _tiles[2:]
+        else:
+            _out.append(_tiles.pop(0))
+        # end if
+    # end while
+    return _out + [0] * (4 - len(_out)), _points
+# end def
+
+
+def reference_move(board, direction):
+    _grid = [[BB.get_cell(board, _r, _c) for _c in range(4)] for _r in range(4)]
+    if direction in (BB.UP, BB.DOWN):
+        _grid = [list(_col) for _col in zip(*_grid)]
+    # end if
+    if direction in (BB.RIGHT, BB.DOWN):
+        _grid = [_row[::-1] for _row in _grid]
+    # end if
+    _moved = [slide_left(_row) for _row in _grid]
+    _points = sum(_p for _row, _p in _moved)
+    _grid = [_row for _row, _p in _moved]
+    if direction in (BB.RIGHT, BB.DOWN):
+        _grid = [_row[::-1] for _row in _grid]
+    # end if
+    if direction in (BB.UP, BB.DOWN):
+        _grid = [list(_col) for _col in zip(*_grid)]
+    # end if
+    _board = 0
+    for _r in range(4):
+        for _c in range(4):
+            _board = BB.set_cell(_board, _r, _c, _grid[_r][_c])
+        # end for
+    # end for
+    return _board, _points
+# end def
+
+
+def test_moves_match_the_reference():
+    _rng = random.Random(2048)
+    for _ in range(500):
+        _board = random_board(_rng, _rng.randint(1, 16))
+        for _direction in BB.DIRECTIONS:
+            assert BB.move_score(_board, _direction) == reference_move(_board, _direction)
+            assert BB.move(_board, _direction) == reference_move(_board, _direction)[0]
+        # end for
+    # end for
+# end def
+
+
+def test_directions_move_towards_their_side():
+    _board = BB.set_cell(0, 1, 1, 1)
+    assert BB.get_cell(BB.move(_board, BB.DOWN), 3, 1) == 1
+    assert BB.get_cell(BB.move(_board, BB.UP), 0, 1) == 1
+    assert BB.get_cell(BB.move(_board, BB.LEFT), 1, 0) == 1
+    assert BB.get_cell(BB.move(_board, BB.RIGHT), 1, 3) == 1
+# end def
+
+
+def test_encode_decode_round_trip():
+    _matrix = [[0, 2, 4, 8], [16, 0, 0, 32], [2, 2, 0, 0], [0, 0, 0, 32768]]
+    _board = BB.encode(_matrix)
+    assert BB.decode(_board) == _matrix
+    assert BB.count_empty(_board) == 8
+    assert BB.max_exponent(_board) == 15
+# end def
+
+
+def test_full_board_without_merges_is_stuck():
+    _board = BB.encode([[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]])
+    assert not BB.can_move(_board)
+    assert BB.can_move(BB.set_cell(_board, 0, 0, 2))
+# end def
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+from src import bitboard as BB
+from test_bitboard import random_board
+
+
+def images(board):
+    return {BB.transform(board, _s) for _s in BB.SYMMETRIES}
+# end def
+
+
+def test_transform_is_undone_by_untransform():
+    _rng = random.Random(7)
+    for _ in range(200):
+        _board = random_board(_rng)
+        for _symmetry in BB.SYMMETRIES:
+            assert BB.untransform(BB.transform(_board, _symmetry), _symmetry) == _board
+        # end for
+    # end for
+# end def
+
+
+def test_symmetries_are_the_eight_images_of_the_square():
+    # one tile per cell value, so every image is a different board
+    _board = sum(_cell << (4 * _cell) for _cell in range(16))
+    assert len(images(_board)) == 8
+    assert BB.transform(_board, 4) == BB.transpose(_board)
+    assert BB.get_cell(BB.flip_horizontal(_board), 0, 3) == BB.get_cell(_board, 0, 0)
+    assert BB.get_cell(BB.flip_vertical(_board), 3, 0) == BB.get_cell(_board, 0, 0)
+# end def
+
+
+def test_canonical_is_shared_by_every_image():
+    _rng = random.Random(11)
+    for _ in range(200):
+        _board = random_board(_rng)
+        _representative, _symmetry = BB.canonical(_board)
+        assert _representative == min(images(_board))
+        assert BB.transform(_board, _symmetry) == _representative
+        for _image in images(_board):
+            assert BB.canonical(_image)[0] == _representative
+        # end for
+    # end for
+# end def
+
+
+def test_directions_follow_the_board():
+    _rng = random.Random(13)
+    for _ in range(100):
+        _board = random_board(_rng)
+        for _symmetry in BB.SYMMETRIES:
+            _image = BB.transform(_board, _symmetry)
+            for _direction in BB.DIRECTIONS:
+                _mapped = BB.transform_direction(_direction, _symmetry)
+                assert BB.move(_image, _mapped) == BB.transform(BB.move(_board, _direction), _symmetry)
+                assert BB.untransform_direction(_mapped, _symmetry) == _direction
+            # end for
+        # end for
+    # end for
+# end def
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from src import bitboard as BB
+from src.expectimax import SPAWNS, Expectimax
+from src.transposition import TranspositionTable
+
+BOARD = BB.encode([[2, 4, 0, 0], [0, 2, 0, 0], [0, 0, 8, 0], [0, 0, 2, 16]])
+
+
+def corner_evaluator(board):
+    # not symmetric: prefers big tiles in the bottom right corner
+    return BB.count_empty(board) + 0.5 * BB.get_cell(board, 3, 3)
+# end def
+
+
+def reference_chance(evaluator, board, depth):
+    _cells = BB.empty_cells(board)
+    if depth <= 1 or not _cells:
+        return evaluator(board)
+    # end if
+    return sum(
+        _p * reference_max(evaluator, board | (_exp << (4 * _cell)), depth - 1)
+        for _cell in _cells for _exp, _p in SPAWNS
+    ) / len(_cells)
+# end def
+
+
+def reference_max(evaluator, board, depth):
+    _values = [
+        reference_chance(evaluator, BB.move(board, _direction), depth)
+        for _direction in BB.DIRECTIONS
+        if BB.move(board, _direction) != board
+    ]
+    return max(_values) if _values else Expectimax.GAME_OVER_SCORE
+# end def
+
+
+def searcher(evaluator=corner_evaluator, **kw):
+    # no clock and no probability cutoff: the search is exhaustive
+    return Expectimax(evaluator, max_time=0, min_probability=0, **kw)
+# end def
+
+
+@pytest.mark.parametrize("depth", [1, 2, 3])
+def test_search_matches_the_reference(depth):
+    _direction, _value = searcher().search(BOARD, depth)
+    assert _value == pytest.approx(reference_max(corner_evaluator, BOARD, depth))
+    assert _value == pytest.approx(reference_chance(corner_evaluator, BB.move(BOARD, _direction), depth))
+# end def
+
+
+def test_table_and_batch_evaluator_keep_the_result():
+    _expected = searcher().search(BOARD, 3)
+    _table = TranspositionTable(1 << 12)
+    _cached = searcher(table=_table)
+    assert _cached.search(BOARD, 3) == pytest.approx(_expected)
+    _nodes = _cached.nodes
+    # a second search is answered from the table
+    assert _cached.search(BOARD, 3) == pytest.approx(_expected)
+    assert _cached.nodes < _nodes and _table.hits
+    _batched = searcher(batch_evaluator=lambda boards: [corner_evaluator(_b) for _b in boards])
+    assert _batched.search(BOARD, 3) == pytest.approx(_expected)
+# end def
+
+
+def test_symmetric_keys_share_entries():
+    _plain_table = TranspositionTable(1 << 12)
+    _symmetric_table = TranspositionTable(1 << 12)
+    _plain = searcher(BB.count_empty, table=_plain_table).search(BOARD, 3)
+    _symmetric = searcher(BB.count_empty, table=_symmetric_table, symmetric=True).search(BOARD, 3)
+    assert _symmetric[1] == pytest.approx(_plain[1])
+    assert len(_symmetric_table) < len(_plain_table)
+# end def
+
+
+def test_no_move_is_game_over():
+    _board = BB.encode([[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]])
+    assert searcher().search(_board, 2) == (None, Expectimax.GAME_OVER_SCORE)
+# end def
+
+
+def test_time_budget_is_kept():
+    # depth 6 takes seconds without a clock; the search stops at the
+    # deadline and plays the best move it has. A few ms of slack cover
+    # the scheduler
+    _max_time = 0.02
+    _search = Expectimax(corner_evaluator, max_time=_max_time, table=TranspositionTable())
+    _times = []
+    for _ in range(10):
+        _search.table.clear()
+        _started = time.perf_counter()
+        _direction, _value = _search.search(BOARD, 6)
+        _times.append(time.perf_counter() - _started)
+        assert _search.timed_out
+        assert BB.move(BOARD, _direction) != BOARD
+    # end for
+    _times.sort()
+    assert _times[len(_times) // 2] <= _max_time
+    assert _times[-1] < _max_time + 0.01
+# end def
+
+
+def test_timed_out_search_plays_a_fully_searched_move():
+    # with no time at all only the one ply scores are left
+    _search = Expectimax(corner_evaluator, max_time=1e-9)
+    _best = max(
+        corner_evaluator(BB.move(BOARD, _d)) for _d in BB.DIRECTIONS
+        if BB.move(BOARD, _d) != BOARD
+    )
+    _direction, _value = _search.search(BOARD, 3)
+    assert _search.timed_out
+    assert _value == corner_evaluator(BB.move(BOARD, _direction)) == _best
+# end def
+
+
+def test_iterative_search_without_a_clock_goes_to_max_depth():
+    _search = searcher()
+    assert _search.iterative_search(BOARD, 3) == pytest.approx(searcher().search(BOARD, 3))
+    assert _search.completed_depth == 3 and not _search.timed_out
+# end def
+
+
+def test_iterative_search_drops_the_iteration_cut_short():
+    # count the leaves of depths 1 and 2, then run out of time a few
+    # leaves into depth 3: the depth 2 answer must come back untouched
+    _calls = []
+
+    def _counting(board):
+        _calls.append(board)
+        return corner_evaluator(board)
+    # end def
+
+    _expected = searcher(_counting).search(BOARD, 2)
+    _budget = len(_calls) + 5
+    del _calls[:]
+
+    def _expiring(board):
+        _calls.append(board)
+        if len(_calls) == _budget:
+            _search._deadline = -1.0
+        # end if
+        return corner_evaluator(board)
+    # end def
+
+    _search = Expectimax(_expiring, max_time=60, min_probability=0)
+    assert _search.iterative_search(BOARD, 6) == pytest.approx(_expected)
+    assert _search.timed_out and _search.completed_depth == 2
+    # and no time is spent after the deadline
+    assert len(_calls) == _budget
+# end def
+
+
+def test_iterative_search_plays_a_forced_move_at_once():
+    # only up is possible
+    _board = BB.encode([[0, 0, 0, 0], [2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4]])
+    _search = searcher()
+    assert _search.iterative_search(_board, 6) == (BB.UP, Expectimax.GAME_OVER_SCORE)
+    assert _search.completed_depth == 0 and _search.nodes == 1
+# end def
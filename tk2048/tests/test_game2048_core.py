@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+from src import bitboard as BB
+from src import game2048_core as GC
+from test_bitboard import random_board
+
+
+def replay(board, events):
+    """
+        applies plan_move events one at a time to a cell dict, checking
+        that no tile lands on an occupied cell.
+    """
+    _cells = {
+        (_r, _c): BB.get_cell(board, _r, _c)
+        for _r in range(4) for _c in range(4)
+        if BB.get_cell(board, _r, _c)
+    }
+    for _from, _to, _fused in events:
+        _exp = _cells.pop(_from)
+        if _fused:
+            assert _cells.pop(_fused) == _exp
+            _exp += 1
+        # end if
+        assert _to not in _cells
+        _cells[_to] = _exp
+    # end for
+    _board = 0
+    for (_r, _c), _exp in _cells.items():
+        _board = BB.set_cell(_board, _r, _c, _exp)
+    # end for
+    return _board
+# end def
+
+
+def positions(count):
+    """
+        random boards, and boards reached by playing random games.
+    """
+    _rng = random.Random(5)
+    for _ in range(count // 2):
+        yield random_board(_rng, _rng.randint(1, 16))
+    # end for
+    _game = GC.Game2048(seed=5)
+    _game.new_game()
+    for _ in range(count - count // 2):
+        if _game.is_game_over():
+            _game.new_game()
+        # end if
+        yield _game.board
+        _game.play(_rng.choice(BB.DIRECTIONS))
+    # end for
+# end def
+
+
+def test_plan_move_replays_to_the_move():
+    for _board in positions(5000):
+        for _direction in BB.DIRECTIONS:
+            _game = GC.Game2048(board=_board)
+            _events = _game.plan_move(_direction)
+            _moved = _game.move(_direction)
+            assert _moved == bool(_events)
+            assert replay(_board, _events) == _game.board
+        # end for
+    # end for
+# end def
+
+
+def test_play_spawns_only_after_a_move():
+    _game = GC.Game2048(seed=1, board=BB.encode([[2, 0, 0, 0]] + [[0] * 4] * 3))
+    assert not _game.play(BB.LEFT)
+    assert BB.count_tiles(_game.board) == 1 and _game.moves == 0
+    assert _game.play(BB.RIGHT)
+    assert BB.count_tiles(_game.board) == 2 and _game.moves == 1
+# end def
+
+
+def test_merges_add_to_the_score():
+    _game = GC.Game2048(board=BB.encode([[2, 2, 4, 4]] + [[0] * 4] * 3))
+    _game.move(BB.LEFT)
+    assert _game.values()[0] == [4, 8, 0, 0]
+    assert _game.score == 12
+# end def
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import numpy as np
+import pytest
+
+from src import bitboard as BB
+from src import heuristics as HE
+from src.game2048_ai import AI
+from test_bitboard import random_board
+
+
+def reference_position(matrix):
+    """
+        AI.evaluate_position as it was before heuristics.py, looping
+        over the snake sequence of one tile matrix.
+    """
+    _score = 0
+    _sequence = [matrix[3][3], matrix[3][2], matrix[3][1], matrix[2][1],
+                 matrix[2][2], matrix[2][3], matrix[1][3], matrix[1][2],
+                 matrix[1][1], matrix[3][0], matrix[2][0], matrix[1][0],
+                 matrix[0][3], matrix[0][2], matrix[0][1], matrix[0][0]]
+    for _i in range(15):
+        _seq = [_sequence[_j] - _sequence[_i] for _j in range(16)]
+        for _j in range(_i + 1, 16):
+            if _seq[_j] > 0:
+                _score -= 1
+            # end if
+        # end for
+        for _j in range(0, _i - 1):
+            if _seq[_j] < 0:
+                _score -= 1
+            # end if
+        # end for
+    # end for
+    _sequence.sort()
+    if matrix[3][3] < _sequence[15]:
+        _score -= _sequence[15] * 10
+    # end if
+    return _score
+# end def
+
+
+def boards(count):
+    _rng = random.Random(3)
+    return [random_board(_rng, _rng.randint(0, 16)) for _ in range(count)]
+# end def
+
+
+def test_default_weights_equal_the_original_position_score():
+    _boards = boards(3000)
+    _expected = [reference_position(BB.decode(_board)) for _board in _boards]
+    _matrices = np.array([BB.decode(_board) for _board in _boards], dtype=float)
+    assert HE.evaluate_batch(_matrices).tolist() == _expected
+    assert HE.evaluate_bitboards(_boards).tolist() == _expected
+    _ai = AI()
+    for _board, _score in zip(_boards[:200], _expected):
+        _ai.set_board(_board)
+        assert _ai.evaluate_position() == _score
+    # end for
+# end def
+
+
+def test_symmetric_weights_score_every_image_alike():
+    _weights = dict(snake=0.0, corner=0.0, empty=1.0, monotonicity=1.0, smoothness=1.0)
+    assert HE.is_symmetric(_weights) and not HE.is_symmetric()
+    for _board in boards(100):
+        _images = [BB.transform(_board, _s) for _s in BB.SYMMETRIES]
+        _scores = HE.evaluate_bitboards(_images, _weights)
+        assert _scores == pytest.approx([_scores[0]] * 8)
+    # end for
+# end def
+
+
+def test_search_leaves_use_the_search_weights():
+    # ai_move keeps the position template, the search scores empty cells
+    _ai = AI()
+    assert _ai.searcher.symmetric and HE.is_symmetric(AI.SEARCH_WEIGHTS)
+    for _board in boards(50):
+        assert _ai.evaluate_board(_board) == float(HE.evaluate_bitboards([_board])[0])
+        assert _ai.evaluate_leaf(_board) == pytest.approx(
+            float(HE.evaluate_bitboards([_board], AI.SEARCH_WEIGHTS)[0])
+        )
+    # end for
+    assert not AI(search_weights=HE.WEIGHTS).searcher.symmetric
+# end def
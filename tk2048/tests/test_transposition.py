@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from src.transposition import TranspositionTable
+
+
+def test_lookups_need_the_depth_searched():
+    _table = TranspositionTable(8)
+    _table.put(1, 2, 10.0)
+    assert _table.get(1, 2) == 10.0
+    assert _table.get(1, 1) == 10.0
+    assert _table.get(1, 3) is None
+    # a shallower result never replaces a deeper one
+    _table.put(1, 1, 5.0)
+    assert _table.get(1, 1) == 10.0
+    assert (_table.hits, _table.misses) == (3, 1)
+    assert _table.hit_rate == 0.75
+# end def
+
+
+def test_lru_evicts_the_least_recently_used():
+    _table = TranspositionTable(2, TranspositionTable.LRU)
+    _table.put(1, 1, 1.0)
+    _table.put(2, 1, 2.0)
+    _table.get(1, 1)
+    _table.put(3, 1, 3.0)
+    assert len(_table) == 2 and _table.evictions == 1
+    assert _table.get(2, 1) is None
+    assert _table.get(1, 1) == 1.0 and _table.get(3, 1) == 3.0
+# end def
+
+
+def test_depth_policy_keeps_the_deeper_entry():
+    # one slot, so every key competes for it
+    _table = TranspositionTable(1, TranspositionTable.DEPTH)
+    _table.put(1, 3, 1.0)
+    _table.put(2, 2, 2.0)
+    assert _table.get(1, 3) == 1.0 and _table.get(2, 1) is None
+    _table.put(2, 3, 2.0)
+    assert _table.get(2, 3) == 2.0 and _table.get(1, 1) is None
+    assert len(_table) == 1 and _table.evictions == 1
+# end def
+
+
+def test_table_never_grows_past_max_entries():
+    for _policy in (TranspositionTable.LRU, TranspositionTable.DEPTH):
+        _table = TranspositionTable(64, _policy)
+        for _key in range(1000):
+            _table.put(_key << 40, 1, float(_key))
+        # end for
+        assert len(_table) <= 64
+        assert _table.stats()["entries"] == len(_table)
+    # end for
+# end def
+
+
+def test_unknown_policy_is_refused():
+    with pytest.raises(ValueError):
+        TranspositionTable(8, "fifo")
+    # end with
+# end def